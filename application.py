@@ -1,5 +1,5 @@
 import asyncio
-import threading
+import contextlib
 
 from fastapi import FastAPI, APIRouter
 
@@ -8,14 +8,17 @@ from starlette.responses import JSONResponse
 from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY
 
 from src.app.aws.handlers import process_sqs_messages
-from src.app.routers import converters, parsers
-from src.app.aws.clients import sqs_client
+from src.app.routers import admin, converters, parsers
+from src.app.aws.clients import aws_clients, get_sqs_client
+from src.app.aws.events import pre_converter
+from src.app.services.converter import shutdown_images_pool
 
 app = FastAPI()
 api_router = APIRouter(prefix="/api/v1")
 
 api_router.include_router(converters.router, prefix="/converter", tags=["Converters"])
 api_router.include_router(parsers.router, prefix="/parser", tags=["Parsers"])
+api_router.include_router(admin.router, prefix="/admin", tags=["Admin"])
 app.include_router(api_router)
 
 
@@ -30,6 +33,19 @@ async def validation_exception_handler(request, exc):
 
 @app.on_event("startup")
 async def startup_event():
-    thread = threading.Thread(target=asyncio.run, args=(process_sqs_messages(sqs_client),))
-    thread.daemon = True
-    thread.start()
+    sqs_client = await get_sqs_client()
+    app.state.sqs_consumer = asyncio.create_task(process_sqs_messages(sqs_client))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    try:
+        app.state.sqs_consumer.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await app.state.sqs_consumer
+    finally:
+        with contextlib.suppress(Exception):
+            await pre_converter.close()
+        with contextlib.suppress(Exception):
+            await aws_clients.close()
+        shutdown_images_pool()
@@ -1,17 +1,89 @@
-import boto3
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Dict, Optional
+
+from aiobotocore.client import AioBaseClient
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
 
 from src.settings.config import settings
 
-s3_client = boto3.client(
-    "s3",
-    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    region_name=settings.AWS_S3_REGION,
-)
-
-sqs_client = boto3.client(
-    "sqs",
-    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    region_name=settings.AWS_S3_REGION,
-)
+
+def build_client_config() -> AioConfig:
+    """
+    Build the client configuration shared by all AWS clients.
+
+    :return: AioConfig with the connection pool, keep-alive, timeouts and retries taken from settings.
+    """
+
+    return AioConfig(
+        max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.AWS_CONNECT_TIMEOUT,
+        read_timeout=settings.AWS_READ_TIMEOUT,
+        retries={"max_attempts": settings.AWS_MAX_ATTEMPTS, "mode": settings.AWS_RETRY_MODE},
+        connector_args={"keepalive_timeout": settings.AWS_KEEPALIVE_TIMEOUT},
+    )
+
+
+class AWSClients:
+    """
+    Registry of long-lived async AWS clients.
+    Clients are created lazily on the running event loop and reused, so every call shares the same connection pool.
+    """
+
+    def __init__(self):
+        self._session = get_session()
+        self._config = build_client_config()
+        self._clients: Dict[str, AioBaseClient] = {}
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._lock = asyncio.Lock()
+
+    async def get_client(self, service_name: str) -> AioBaseClient:
+        """
+        Return the shared client for the service, creating it on first use.
+
+        :param service_name: AWS service name, e.g. "s3" or "sqs".
+        :return: Open aiobotocore client.
+        """
+
+        client = self._clients.get(service_name)
+        if client is not None:
+            return client
+
+        async with self._lock:
+            if service_name not in self._clients:
+                if self._exit_stack is None:
+                    self._exit_stack = AsyncExitStack()
+
+                self._clients[service_name] = await self._exit_stack.enter_async_context(
+                    self._session.create_client(
+                        service_name,
+                        region_name=settings.AWS_S3_REGION,
+                        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                        config=self._config,
+                    )
+                )
+
+        return self._clients[service_name]
+
+    async def close(self) -> None:
+        """Close all open clients and release their connection pools."""
+
+        async with self._lock:
+            if self._exit_stack is not None:
+                await self._exit_stack.aclose()
+
+            self._exit_stack = None
+            self._clients.clear()
+
+
+aws_clients = AWSClients()
+
+
+async def get_s3_client() -> AioBaseClient:
+    return await aws_clients.get_client("s3")
+
+
+async def get_sqs_client() -> AioBaseClient:
+    return await aws_clients.get_client("sqs")
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import time
+from pathlib import PurePosixPath
+from typing import Dict, List, Optional, Set
+from urllib.parse import unquote_plus
+
+from src.app.aws.responses import AWSErrorResponse
+from src.app.aws.utils import get_object_etag, get_object_metadata, head_object, normalize_etag
+from src.app.constants import ALLOWED_FILE_FORMATS, ALLOWED_IMAGES_TYPES, CONVERTED_FROM_METADATA
+from src.app.handlers import convert_file, get_converted_s3_key, preconverted, single_flight
+from src.app.models.statuses import Status
+from src.app.services.converter import FileConverterService
+from src.settings.config import settings, logger
+
+
+def unwrap_s3_event(message_body: Dict) -> Optional[Dict]:
+    """
+    Return the S3 event notification carried by the message, or None for regular messages.
+    Notifications delivered directly by S3 and through an SNS topic are both supported.
+
+    :param message_body: Parsed body of the SQS message.
+    :return: The S3 event dict (with `Records` or the `s3:TestEvent` marker) or None.
+    """
+
+    if message_body.get("Type") == "Notification" and isinstance(message_body.get("Message"), str):
+        try:
+            message_body = json.loads(message_body["Message"])
+        except json.JSONDecodeError:
+            return None
+
+    if "Records" in message_body or message_body.get("Event") == "s3:TestEvent":
+        return message_body
+
+    return None
+
+
+class PreConverter:
+    """
+    Runs the default conversions for newly uploaded files in the background.
+
+    Conversions start only while the node has spare capacity (fewer than `PRECONVERT_MAX_ACTIVE_JOBS`
+    jobs in flight) and at most `PRECONVERT_MAX_CONCURRENCY` of them run at once. They go through
+    `convert_file`, so a user request for the same conversion joins the running one, and their results are
+    recorded, so later requests are answered without converting again.
+    A pre-conversion never replaces a file which was not produced by a conversion, e.g. a `contract.txt`
+    uploaded by the client next to `contract.pdf`.
+    """
+
+    def __init__(self):
+        self._semaphore = asyncio.Semaphore(settings.PRECONVERT_MAX_CONCURRENCY)
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def handle_event(self, event: Dict) -> None:
+        """
+        Schedule the conversions for every `ObjectCreated` record of the event.
+
+        :param event: S3 event notification.
+        """
+
+        for record in event.get("Records", []):
+            if not record.get("eventName", "").startswith("ObjectCreated"):
+                continue
+
+            bucket = record.get("s3", {}).get("bucket", {}).get("name")
+            s3_key = unquote_plus(record.get("s3", {}).get("object", {}).get("key", ""))
+            if bucket != settings.AWS_S3_BUCKET_NAME or not s3_key:
+                continue
+
+            format_from = PurePosixPath(s3_key).suffix.lstrip(".").lower()
+            if format_from not in ALLOWED_FILE_FORMATS + ALLOWED_IMAGES_TYPES:
+                continue
+
+            formats_to = [
+                format_to
+                for format_to in settings.PRECONVERT_FORMATS
+                if FileConverterService.is_supported(format_from, format_to)
+            ]
+            await preconverted.invalidate(s3_key, format_from, formats_to)
+            if not formats_to:
+                continue
+
+            etag = record["s3"]["object"].get("eTag")
+            etag = normalize_etag(etag) if etag else None
+            task = asyncio.create_task(self._preconvert(s3_key, etag, format_from, formats_to))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _preconvert(self, s3_key: str, etag: Optional[str], format_from: str, formats_to: List[str]) -> None:
+        async with self._semaphore:
+            head, is_found = await head_object(settings.AWS_S3_BUCKET_NAME, s3_key)
+            if not is_found or CONVERTED_FROM_METADATA in head.get("Metadata", {}):
+                return
+
+            current_etag = normalize_etag(head["ETag"])
+            if etag is not None and etag != current_etag:
+                logger.info(f"Skipping pre-conversion of {s3_key}, a newer version was uploaded")
+                return
+            etag = current_etag
+
+            for format_to in formats_to:
+                if not await self._wait_for_capacity():
+                    logger.info(f"No spare capacity, skipping pre-conversion of {s3_key} to {format_to}")
+                    return
+
+                if not await self._is_target_replaceable(get_converted_s3_key(s3_key, format_from, format_to)):
+                    logger.info(f"Skipping pre-conversion of {s3_key} to {format_to}, the target is a client file")
+                    continue
+
+                status, data = await convert_file(s3_key, format_from, format_to, etag=etag)
+                if status != Status.SUCCESS:
+                    continue
+
+                current_etag, is_found = await get_object_etag(settings.AWS_S3_BUCKET_NAME, s3_key)
+                if not is_found or current_etag != etag:
+                    logger.info(f"File {s3_key} changed during its pre-conversion, the result is not stored")
+                    return
+
+                await preconverted.set(s3_key, format_from, format_to, etag, data)
+                logger.info(f"File {s3_key} pre-converted to {format_to}")
+
+    async def close(self) -> None:
+        """Cancel the scheduled and running pre-conversions and wait for them to finish."""
+
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _is_target_replaceable(target_s3_key: str) -> bool:
+        """The target may be written if it does not exist yet or was itself produced by a conversion."""
+
+        metadata, is_found = await get_object_metadata(settings.AWS_S3_BUCKET_NAME, target_s3_key)
+        if is_found:
+            return CONVERTED_FROM_METADATA in metadata
+        return metadata == AWSErrorResponse.FILE_NOT_FOUND
+
+    @staticmethod
+    async def _wait_for_capacity() -> bool:
+        deadline = time.monotonic() + settings.PRECONVERT_MAX_WAIT
+        while single_flight.active_jobs >= settings.PRECONVERT_MAX_ACTIVE_JOBS:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(settings.PRECONVERT_CAPACITY_CHECK_INTERVAL)
+
+        return True
+
+
+pre_converter = PreConverter()
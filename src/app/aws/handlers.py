@@ -2,37 +2,63 @@ import asyncio
 import json
 from typing import Optional, Tuple, Union, Dict
 
-from src.app.handlers import convert_file, file_scraper
+from pydantic import ValidationError
+
+from src.app.aws.events import pre_converter, unwrap_s3_event
+from src.app.handlers import convert_file, file_scraper, images_to_pdf
+from src.app.models.images import ImagesToPdfRequest
+from src.app.models.parsing import FileParsingRequest
 from src.app.models.statuses import Status
-from src.app.utils import callback
-from src.settings.config import settings
+from src.app.utils import paginated_callback
+from src.settings.config import settings, logger
 
 
 async def process_sqs_messages(sqs_client) -> None:
+    """
+    Consume the SQS queue until cancelled.
+    Errors never stop the consumer: they are logged and polling is retried with exponential backoff.
+    """
+
+    backoff = 0.0
     while True:
-        response = sqs_client.receive_message(
-            QueueUrl=settings.AWS_SQS_QUEUE_URL, MaxNumberOfMessages=10, WaitTimeSeconds=20, VisibilityTimeout=30
-        )
+        try:
+            response = await sqs_client.receive_message(
+                QueueUrl=settings.AWS_SQS_QUEUE_URL, MaxNumberOfMessages=10, WaitTimeSeconds=20, VisibilityTimeout=30
+            )
+            backoff = 0.0
 
-        messages = response.get("Messages", [])
-        if not messages:
-            await asyncio.sleep(0.5)
-            continue
+            messages = response.get("Messages", [])
+            if not messages:
+                await asyncio.sleep(0.5)
+                continue
 
-        tasks = [asyncio.create_task(handle_message(sqs_client, message)) for message in messages]
-        await asyncio.gather(*tasks)
+            tasks = [asyncio.create_task(handle_message(sqs_client, message)) for message in messages]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for message, result in zip(messages, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Failed to handle SQS message {message.get('MessageId')}: {str(result)}")
+        except Exception as e:
+            backoff = min(max(backoff * 2, 1.0), settings.AWS_SQS_MAX_BACKOFF)
+            logger.error(f"Failed to receive SQS messages, retrying in {backoff} s: {str(e)}")
+            await asyncio.sleep(backoff)
 
 
 async def handle_message(sqs_client, message: dict) -> None:
     try:
         message_body = json.loads(message["Body"])
+        s3_event = unwrap_s3_event(message_body)
+        if s3_event is not None:
+            if settings.PRECONVERT_ENABLED:
+                await pre_converter.handle_event(s3_event)
+            return
+
         s3_key = message_body.get("s3_key")
         callback_url = message_body.get("callback_url")
 
         status, result = await process_message_body(message_body, s3_key)
         status = Status.ERROR if status is None else status
         result = {"message": "Missing a necessary argument"} if result is None else result
-        await callback(callback_url, status=status, data=result)
+        await paginated_callback(callback_url, status=status, data=result)
 
     finally:
         await delete_sqs_message(sqs_client, message)
@@ -40,15 +66,51 @@ async def handle_message(sqs_client, message: dict) -> None:
 
 async def process_message_body(message_body: dict, s3_key: Optional[str]) -> Union[Tuple[str, Dict], Tuple[None, None]]:
     format_from, format_to = message_body.get("format_from"), message_body.get("format_to")
-    keywords = message_body.get("keywords")
+    keywords, queries = message_body.get("keywords"), message_body.get("queries")
+    profile = bool(message_body.get("profile", False))
 
-    if format_from and format_to:
-        return await convert_file(s3_key=s3_key, old_format=format_from, format_to=format_to)
-    elif keywords:
-        return await file_scraper(s3_key=s3_key, keywords=keywords)
+    if message_body.get("output_s3_key"):
+        return await process_images_message(message_body)
+    elif format_from and format_to:
+        return await convert_file(s3_key=s3_key, old_format=format_from, format_to=format_to, profile=profile)
+    elif keywords or queries:
+        return await process_parse_message(message_body)
 
     return None, None
 
 
+async def process_images_message(message_body: dict) -> Tuple[str, Dict]:
+    try:
+        request = ImagesToPdfRequest.model_validate(message_body)
+    except ValidationError as e:
+        logger.error(f"Invalid images to PDF message: {str(e)}")
+        return Status.ERROR, {"message": "Invalid images to PDF request"}
+
+    return await images_to_pdf(
+        output_s3_key=request.output_s3_key,
+        s3_keys=request.s3_keys,
+        prefix=request.prefix,
+        max_dimension=request.max_dimension,
+        jpeg_quality=request.jpeg_quality,
+        profile=request.profile,
+    )
+
+
+async def process_parse_message(message_body: dict) -> Tuple[str, Dict]:
+    try:
+        request = FileParsingRequest.model_validate(message_body)
+    except ValidationError as e:
+        logger.error(f"Invalid parse message: {str(e)}")
+        return Status.ERROR, {"message": "Invalid parse request"}
+
+    return await file_scraper(
+        s3_key=request.s3_key,
+        keywords=request.keywords,
+        max_results=request.max_results,
+        queries=request.queries,
+        profile=request.profile,
+    )
+
+
 async def delete_sqs_message(sqs_client, message: dict) -> None:
-    sqs_client.delete_message(QueueUrl=settings.AWS_SQS_QUEUE_URL, ReceiptHandle=message["ReceiptHandle"])
+    await sqs_client.delete_message(QueueUrl=settings.AWS_SQS_QUEUE_URL, ReceiptHandle=message["ReceiptHandle"])
@@ -10,3 +10,5 @@ class AWSErrorResponse(str, Enum):
     ERROR_DOWNLOAD_FILE = "File download failed"
     ERROR_UPLOAD_FILE = "File upload failed"
     FILE_MISSED_OR_EMPTY = "Download failed: file is missing or empty"
+    ERROR_LIST_FILES = "Failed to list files"
+    FILE_NOT_FOUND = "File not found"
@@ -1,52 +1,118 @@
-import asyncio
+import contextlib
 import os
-from concurrent import futures
-from io import BytesIO
-from typing import Tuple, Union
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 
+import aiofiles
 from botocore.exceptions import BotoCoreError, ClientError
 
-from src.app.aws.clients import s3_client
-from src.settings.config import logger
+from src.app.aws.clients import get_s3_client
+from src.app.buffers import JobBuffer
+from src.settings.config import settings, logger
 from src.app.constants import CONTENT_TYPES
 from src.app.aws.responses import AWSErrorResponse, AWSSuccessResponse
 
 
-def sync_download_file_as_bytes(bucket: str, s3_key: str) -> Tuple[Union[BytesIO, str], bool]:
+async def download_file_to_buffer(
+    bucket: str, s3_key: str, etag: Optional[str] = None
+) -> Tuple[Union[JobBuffer, str], bool]:
     """
-    Downloads a file from S3 and returns it as BytesIO object.
+    Downloads a file from S3 into a JobBuffer, chunk by chunk.
+    Big files are spilled to disk by the buffer instead of being held in memory.
 
     :param bucket: S3 bucket name.
     :param s3_key: Destination file name in S3.
-    :return: A Tuple (`BytesIO`, `True`) if the download is successful.
+    :param etag: Optional ETag of the expected version, the download fails if the object has changed since.
+    :return: A Tuple (`JobBuffer`, `True`) if the download is successful.
              A Tuple (`str`, `False`) if the download fails.
     """
 
+    file_buffer = JobBuffer()
     try:
-        response = s3_client.get_object(Bucket=bucket, Key=s3_key)
+        s3_client = await get_s3_client()
+        conditions = {"IfMatch": f'"{etag}"'} if etag is not None else {}
+        response = await s3_client.get_object(Bucket=bucket, Key=s3_key, **conditions)
+        async with response["Body"]:
+            async for chunk in response["Body"].iter_chunks():
+                file_buffer.write(chunk)
+
+        file_buffer.seek(0)
         logger.info(f"File {s3_key} downloaded from S3")
-        return BytesIO(response["Body"].read()), True
+        return file_buffer, True
     except (BotoCoreError, ClientError) as e:
+        file_buffer.close()
         logger.error(f"Failed to download file from S3: {str(e)}")
         return AWSErrorResponse.ERROR_DOWNLOAD_FILE, False
+    except Exception:
+        file_buffer.close()
+        raise
 
 
-def sync_upload_bytes_to_s3(bucket: str, s3_key: str, file_bytes: BytesIO, file_format: str) -> Tuple[str, bool]:
+async def put_fileobj(s3_client, bucket: str, s3_key: str, fileobj: BinaryIO, size: int, **extra_args) -> None:
     """
-    Uploads a BytesIO object to S3.
+    Uploads the file object with a single request, or with a multipart upload when it is bigger than
+    `AWS_S3_MULTIPART_THRESHOLD`, so that big objects (above the 5 GB single request limit) can be stored too.
+    A failed multipart upload is aborted so that its parts are not kept in the bucket.
 
+    :param s3_client: Async S3 client.
     :param bucket: S3 bucket name.
     :param s3_key: Destination file name in S3.
-    :param file_bytes: File content in BytesIO.
+    :param fileobj: Binary file object positioned at the start of the content.
+    :param size: Size of the content in bytes.
+    :param extra_args: Object arguments, e.g. `ContentType` and `Metadata`.
+    """
+
+    if size <= settings.AWS_S3_MULTIPART_THRESHOLD:
+        await s3_client.put_object(Bucket=bucket, Key=s3_key, Body=fileobj, **extra_args)
+        return
+
+    upload = await s3_client.create_multipart_upload(Bucket=bucket, Key=s3_key, **extra_args)
+    upload_id = upload["UploadId"]
+    try:
+        parts = []
+        while chunk := fileobj.read(settings.AWS_S3_MULTIPART_CHUNK_SIZE):
+            part_number = len(parts) + 1
+            response = await s3_client.upload_part(
+                Bucket=bucket, Key=s3_key, UploadId=upload_id, PartNumber=part_number, Body=chunk
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+        await s3_client.complete_multipart_upload(
+            Bucket=bucket, Key=s3_key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+        )
+    except BaseException:
+        with contextlib.suppress(BotoCoreError, ClientError):
+            await s3_client.abort_multipart_upload(Bucket=bucket, Key=s3_key, UploadId=upload_id)
+        raise
+
+
+async def upload_buffer_to_s3(
+    bucket: str, s3_key: str, file_buffer: JobBuffer, file_format: str, metadata: Optional[Dict[str, str]] = None
+) -> Tuple[str, bool]:
+    """
+    Uploads a JobBuffer to S3, streaming it from memory or from its file.
+    Buffers bigger than `AWS_S3_MULTIPART_THRESHOLD` are uploaded in parts.
+
+    :param bucket: S3 bucket name.
+    :param s3_key: Destination file name in S3.
+    :param file_buffer: File content in JobBuffer.
     :param file_format: Target file format (used for MIME type).
+    :param metadata: Optional user metadata of the object.
     :return: Tuple (status message, success flag).
     """
 
     content_type = CONTENT_TYPES.get(file_format, "application/octet-stream")
 
     try:
-        file_bytes.seek(0)
-        s3_client.upload_fileobj(file_bytes, bucket, s3_key, ExtraArgs={"ContentType": content_type})
+        s3_client = await get_s3_client()
+        await put_fileobj(
+            s3_client,
+            bucket,
+            s3_key,
+            file_buffer.fileobj(),
+            file_buffer.size,
+            ContentType=content_type,
+            Metadata=metadata or {},
+        )
         logger.info(f"File {s3_key} uploaded to S3")
         return AWSSuccessResponse.FILE_UPLOADED, True
 
@@ -55,100 +121,88 @@ def sync_upload_bytes_to_s3(bucket: str, s3_key: str, file_bytes: BytesIO, file_
         return AWSErrorResponse.ERROR_UPLOAD_FILE, False
 
 
-def sync_download_file(bucket: str, s3_key: str, input_path: str) -> Tuple[str, bool]:
+async def head_object(bucket: str, s3_key: str) -> Tuple[Union[Dict, str], bool]:
     """
-    Downloads a file from an S3 bucket.
+    Reads the attributes of an object in S3 without downloading it.
 
-    :param bucket: Name of the S3 bucket.
+    :param bucket: S3 bucket name.
     :param s3_key: File name (key) in the S3 bucket.
-    :param input_path: Local path to save the downloaded file.
-    :return: A tuple (`str`, `True`) if the download is successful.
-             A tuple (`str`, `False`) with an error message if the download fails.
+    :return: A Tuple (`dict`, `True`) with the HEAD response (`Metadata`, `ETag`, ...) if the object exists.
+             A Tuple (`FILE_NOT_FOUND`, `False`) if there is no such object.
+             A Tuple (`str`, `False`) if the request fails.
     """
 
     try:
-        logger.info("File download started")
-
-        s3_client.download_file(bucket, s3_key, input_path)
-        if not os.path.exists(input_path) or os.path.getsize(input_path) == 0:
-            logger.error("Download failed: file is missing or empty")
-            return "Download failed: file is missing or empty", False
-
-        logger.info("File has been downloaded")
-        return AWSSuccessResponse.FILE_DOWNLOADED, True
-    except ClientError as error:
-        logger.error(f"Client error: {error.response['Error']['Message']}")
+        s3_client = await get_s3_client()
+        return await s3_client.head_object(Bucket=bucket, Key=s3_key), True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return AWSErrorResponse.FILE_NOT_FOUND, False
+        logger.error(f"Failed to read the object metadata from S3: {str(e)}")
         return AWSErrorResponse.ERROR_DOWNLOAD_FILE, False
-    except Exception as e:
-        logger.error(f"An internal error occurred: {str(e)}")
+    except BotoCoreError as e:
+        logger.error(f"Failed to read the object metadata from S3: {str(e)}")
         return AWSErrorResponse.ERROR_DOWNLOAD_FILE, False
 
 
-def sync_upload_file(file_path: str, bucket_name: str, key: str) -> Tuple[str, bool]:
+async def get_object_metadata(bucket: str, s3_key: str) -> Tuple[Union[Dict[str, str], str], bool]:
     """
-    Function to upload the file to the AWS S3 bucket.
+    Reads the user metadata of an object in S3 without downloading it.
 
-    :param file_path: Path to convert the file.
-    :param bucket_name: Name of the S3 bucket.
-    :param key: New name of the file in the S3 bucket.
-    :return: A tuple (`str`, `True`) if the file is uploaded successfully.
-                A tuple (`str`, `False`) with an error message if the file is not uploaded.
+    :param bucket: S3 bucket name.
+    :param s3_key: File name (key) in the S3 bucket.
+    :return: A Tuple (`dict`, `True`) with the metadata if the object exists, otherwise the same as `head_object`.
     """
 
-    try:
-        logger.info("Started uploading file")
-
-        s3_client.upload_file(file_path, bucket_name, key)
-        if not os.path.exists(file_path) and os.path.getsize(file_path) <= 0:
-            logger.info("An error while uploading file")
-            return AWSErrorResponse.ERROR_UPLOAD_FILE, False
-
-        logger.info("File has been uploaded to AWS S3")
-        return AWSSuccessResponse.FILE_UPLOADED, True
-
-    except Exception as e:
-        logger.error(f"S3 upload error: {str(e)}")
-        return AWSErrorResponse.ERROR_UPLOAD_FILE, False
+    response, is_found = await head_object(bucket, s3_key)
+    return (response.get("Metadata", {}), True) if is_found else (response, False)
 
 
-async def download_file_as_bytes(bucket: str, s3_key: str) -> Tuple[Union[BytesIO, str], bool]:
+async def get_object_etag(bucket: str, s3_key: str) -> Tuple[str, bool]:
     """
-    Downloads a file from S3 and returns it as BytesIO object.
+    Reads the ETag of an object in S3, which changes with every new version of the object.
 
     :param bucket: S3 bucket name.
-    :param s3_key: Destination file name in S3.
-    :return: A Tuple (`BytesIO`, True) if the download is successful.
-             A Tuple (None, False) if the download fails.
+    :param s3_key: File name (key) in the S3 bucket.
+    :return: A Tuple (`str`, `True`) with the ETag without quotes if the object exists,
+             otherwise the same as `head_object`.
     """
 
-    loop = asyncio.get_event_loop()
-    with futures.ThreadPoolExecutor() as pool:
-        result = await loop.run_in_executor(pool, sync_download_file_as_bytes, bucket, s3_key)
+    response, is_found = await head_object(bucket, s3_key)
+    return (normalize_etag(response["ETag"]), True) if is_found else (response, False)
+
 
-    return result
+def normalize_etag(etag: str) -> str:
+    """S3 returns ETags in quotes, while event notifications carry them bare."""
+    return etag.strip('"')
 
 
-async def upload_bytes_to_s3(bucket: str, s3_key: str, file_bytes: BytesIO, file_format: str) -> Tuple[str, bool]:
+async def list_object_keys(bucket: str, prefix: str) -> Tuple[Union[List[str], str], bool]:
     """
-    Uploads a BytesIO object to S3.
+    Lists the keys of all objects in S3 under the prefix.
 
     :param bucket: S3 bucket name.
-    :param s3_key: Destination file name in S3.
-    :param file_bytes: File content in BytesIO.
-    :param file_format: Target file format (used for MIME type).
-    :return: Tuple (status message, success flag).
+    :param prefix: Prefix of the keys, e.g. a "directory" name.
+    :return: A Tuple (`list`, `True`) with the keys in S3 (lexicographical) order if the request is successful.
+             A Tuple (`str`, `False`) if the request fails.
     """
 
-    loop = asyncio.get_event_loop()
-    with futures.ThreadPoolExecutor() as pool:
-        result = await loop.run_in_executor(pool, sync_upload_bytes_to_s3, bucket, s3_key, file_bytes, file_format)
+    try:
+        s3_client = await get_s3_client()
+        paginator = s3_client.get_paginator("list_objects_v2")
+        keys = []
+        async for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
 
-    return result
+        return keys, True
+    except (BotoCoreError, ClientError) as e:
+        logger.error(f"Failed to list files in S3: {str(e)}")
+        return AWSErrorResponse.ERROR_LIST_FILES, False
 
 
 async def download_file(bucket: str, s3_key: str, input_path: str) -> Tuple[str, bool]:
     """
-    Downloads a file from an S3 bucket.
+    Downloads a file from an S3 bucket, streaming it to disk in chunks.
 
     :param bucket: Name of the S3 bucket.
     :param s3_key: File name (key) in the S3 bucket.
@@ -157,16 +211,32 @@ async def download_file(bucket: str, s3_key: str, input_path: str) -> Tuple[str,
              A tuple (`str`, `False`) with an error message if the download fails.
     """
 
-    loop = asyncio.get_event_loop()
-    with futures.ProcessPoolExecutor() as pool:
-        result = await loop.run_in_executor(pool, sync_download_file, bucket, s3_key, input_path)
+    try:
+        logger.info("File download started")
 
-    return result
+        s3_client = await get_s3_client()
+        response = await s3_client.get_object(Bucket=bucket, Key=s3_key)
+        async with response["Body"], aiofiles.open(input_path, mode="wb") as file:
+            async for chunk in response["Body"].iter_chunks():
+                await file.write(chunk)
+
+        if not os.path.exists(input_path) or os.path.getsize(input_path) == 0:
+            logger.error("Download failed: file is missing or empty")
+            return AWSErrorResponse.FILE_MISSED_OR_EMPTY, False
+
+        logger.info("File has been downloaded")
+        return AWSSuccessResponse.FILE_DOWNLOADED, True
+    except ClientError as error:
+        logger.error(f"Client error: {error.response['Error']['Message']}")
+        return AWSErrorResponse.ERROR_DOWNLOAD_FILE, False
+    except Exception as e:
+        logger.error(f"An internal error occurred: {str(e)}")
+        return AWSErrorResponse.ERROR_DOWNLOAD_FILE, False
 
 
 async def upload_file_to_s3(file_path: str, bucket_name: str, key: str) -> Tuple[str, bool]:
     """
-    Through the `upload_file_sync` function to own event loop. Makes the sync upload_file_sync function async.
+    Function to upload the file to the AWS S3 bucket.
 
     :param file_path: Path to convert the file.
     :param bucket_name: Name of the S3 bucket.
@@ -175,8 +245,20 @@ async def upload_file_to_s3(file_path: str, bucket_name: str, key: str) -> Tuple
              A tuple (`str`, `False`) with an error message if the file is not uploaded.
     """
 
-    loop = asyncio.get_event_loop()
-    with futures.ThreadPoolExecutor() as pool:
-        result = await loop.run_in_executor(pool, sync_upload_file, file_path, bucket_name, key)
+    try:
+        logger.info("Started uploading file")
 
-    return result
+        if not os.path.exists(file_path) or os.path.getsize(file_path) <= 0:
+            logger.info("An error while uploading file")
+            return AWSErrorResponse.ERROR_UPLOAD_FILE, False
+
+        s3_client = await get_s3_client()
+        with open(file_path, mode="rb") as file:
+            await put_fileobj(s3_client, bucket_name, key, file, os.path.getsize(file_path))
+
+        logger.info("File has been uploaded to AWS S3")
+        return AWSSuccessResponse.FILE_UPLOADED, True
+
+    except Exception as e:
+        logger.error(f"S3 upload error: {str(e)}")
+        return AWSErrorResponse.ERROR_UPLOAD_FILE, False
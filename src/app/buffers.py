@@ -0,0 +1,194 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Union
+
+from src.settings.config import settings, logger
+
+
+class BufferTracker:
+    """Counts the bytes held in memory and on disk by all buffers of one job."""
+
+    def __init__(self, job: str):
+        self.job = job
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.peak_memory_bytes = 0
+        self.peak_disk_bytes = 0
+        self._lock = threading.Lock()
+
+    def update(self, memory_delta: int, disk_delta: int) -> None:
+        with self._lock:
+            self.memory_bytes += memory_delta
+            self.disk_bytes += disk_delta
+            self.peak_memory_bytes = max(self.peak_memory_bytes, self.memory_bytes)
+            self.peak_disk_bytes = max(self.peak_disk_bytes, self.disk_bytes)
+
+
+_current_tracker: ContextVar[Optional[BufferTracker]] = ContextVar("current_buffer_tracker", default=None)
+
+
+@contextmanager
+def track_buffers(job: str) -> Iterator[BufferTracker]:
+    """
+    Account every `JobBuffer` created inside the block (including worker threads started from it) to the job.
+
+    :param job: Name of the job used in the log message.
+    :return: The tracker with the current and peak number of bytes held by the job.
+    """
+
+    tracker = BufferTracker(job)
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_tracker.reset(token)
+        logger.info(
+            f"Job {job} buffers peak: {tracker.peak_memory_bytes} B in memory, {tracker.peak_disk_bytes} B on disk",
+            extra={"peak_memory_bytes": tracker.peak_memory_bytes, "peak_disk_bytes": tracker.peak_disk_bytes},
+        )
+
+
+class JobBuffer:
+    """
+    Binary file-like buffer passed between the pipeline stages.
+
+    The content is kept in memory while it is smaller than `max_memory_size` and is moved to a temporary file
+    once it grows above it. Stages pass the buffer itself along: tools which read from the file system get
+    its file through `path()`, and only consumers which accept nothing but bytes (PyMuPDF streams, worker
+    processes) copy the content with `getvalue()`. The temporary file is removed when the buffer is closed.
+    """
+
+    def __init__(self, max_memory_size: Optional[int] = None):
+        self._max_memory_size = settings.BUFFER_MAX_MEMORY_SIZE if max_memory_size is None else max_memory_size
+        self._file: BinaryIO = BytesIO()
+        self._path: Optional[Path] = None
+        self._size = 0
+        self._tracker = _current_tracker.get()
+        self._accounted_memory = 0
+        self._accounted_disk = 0
+        self.closed = False
+
+    @classmethod
+    def from_path(cls, path: Union[str, Path]) -> "JobBuffer":
+        """
+        Take over an existing file without reading it into memory. The file is removed when the buffer is closed.
+
+        :param path: Path to the file.
+        :return: Buffer backed by the file.
+        """
+
+        buffer = cls()
+        buffer._file = open(path, mode="r+b")
+        buffer._path = Path(path)
+        buffer._size = os.fstat(buffer._file.fileno()).st_size
+        buffer._account()
+        return buffer
+
+    @property
+    def in_memory(self) -> bool:
+        return self._path is None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def write(self, data) -> int:
+        if self.in_memory and self._file.tell() + memoryview(data).nbytes > self._max_memory_size:
+            self.rollover()
+
+        written = self._file.write(data)
+        self._size = max(self._size, self._file.tell())
+        self._account()
+        return written
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def rollover(self) -> None:
+        """Move the content from memory to a temporary file."""
+
+        if not self.in_memory:
+            return
+
+        fd, path = tempfile.mkstemp(dir=settings.BUFFER_TMP_DIR, suffix=".buffer")
+        file = os.fdopen(fd, mode="w+b")
+        position = self._file.tell()
+        with self._file.getbuffer() as view:
+            file.write(view)
+
+        file.seek(position)
+        self._file.close()
+        self._file = file
+        self._path = Path(path)
+        self._account()
+
+    def path(self) -> Path:
+        """Return the path of the file with the content, moving the content to disk if needed."""
+
+        self.rollover()
+        self._file.flush()
+        return self._path
+
+    def getvalue(self) -> bytes:
+        """Return the content as bytes. It is a copy, so use it only for consumers which accept nothing else."""
+
+        if self.in_memory:
+            return self._file.getvalue()
+
+        return self.path().read_bytes()
+
+    def fileobj(self) -> BinaryIO:
+        """Return the underlying file object rewound to the start, e.g. to stream it to S3."""
+
+        self._file.flush()
+        self._file.seek(0)
+        return self._file
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        self._file.close()
+        if self._path is not None:
+            self._path.unlink(missing_ok=True)
+
+        self._size = 0
+        self.closed = True
+        self._account()
+
+    def _account(self) -> None:
+        memory = self._size if self.in_memory else 0
+        disk = 0 if self.in_memory else self._size
+        if self._tracker is not None:
+            self._tracker.update(memory - self._accounted_memory, disk - self._accounted_disk)
+
+        self._accounted_memory, self._accounted_disk = memory, disk
+
+    def __enter__(self) -> "JobBuffer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -10,3 +10,7 @@ CONTENT_TYPES = {
 
 ALLOWED_IMAGES_TYPES = ["png", "jpg", "jpeg"]
 ALLOWED_FILE_FORMATS = ["pdf", "doc", "docx", "txt"]
+
+DEFAULT_QUERY_NAME = "default"
+
+CONVERTED_FROM_METADATA = "converted-from"
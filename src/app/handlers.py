@@ -1,89 +1,287 @@
+import functools
+import json
 import tempfile
-from typing import List
+from pathlib import PurePosixPath
+from typing import List, Optional
 
-from src.app.aws.utils import download_file_as_bytes, upload_bytes_to_s3, download_file
-from src.app.constants import CONTENT_TYPES
+from src.app.aws.utils import (
+    download_file,
+    download_file_to_buffer,
+    get_object_etag,
+    list_object_keys,
+    upload_buffer_to_s3,
+)
+from src.app.buffers import track_buffers
+from src.app.constants import ALLOWED_IMAGES_TYPES, CONVERTED_FROM_METADATA, DEFAULT_QUERY_NAME
+from src.app.models.queries import SearchQuery
 from src.app.models.statuses import Status
+from src.app.preconverted import get_preconverted_registry
+from src.app.profiling import profile_job
 from src.app.services import get_file_scraper_service, get_file_converter_service
+from src.app.singleflight import get_single_flight
 from src.app.typing.converter import ConverterHandler
 from src.app.typing.scraper import ScraperHandler
+from src.app.utils import natural_sort_key
 from src.settings.config import settings, logger
+from src.settings.log import job_context
 
+single_flight = get_single_flight()
+preconverted = get_preconverted_registry()
 
-async def convert_file(s3_key: str, old_format: str, format_to: str) -> ConverterHandler:
+
+async def convert_file(
+    s3_key: str, old_format: str, format_to: str, profile: bool = False, etag: Optional[str] = None
+) -> ConverterHandler:
     """
     Function to convert the file as bytes from S3 bucket from one format to another.
+    Concurrent calls with the same arguments share a single conversion.
+    If the current version of the file was already converted speculatively after its upload,
+    that result is returned right away.
+    A profiled call always runs its own conversion, so that the profile describes real work.
     **Returns tuple with the str and the dict if the process was successful,
     otherwise returns tuple with the str and the str.**
 
     :param s3_key: name of the file in the S3 bucket - **str**.
     :param old_format: format of the file to convert - **str**.
     :param format_to: format to convert the file - **str**.
+    :param profile: capture a CPU profile and an allocation snapshot of the conversion - **bool**.
+    :param etag: ETag of the version of the file to convert, the file must not change during the conversion - **str**.
+    :return: tuple with the status and the data. **status - str, data - str or dict**.
+    """
+
+    if profile:
+        return await _convert_file(s3_key, old_format, format_to, profile, etag)
+
+    if settings.PRECONVERT_ENABLED:
+        if etag is None:
+            etag, is_found = await get_object_etag(settings.AWS_S3_BUCKET_NAME, s3_key)
+            if not is_found:
+                return Status.ERROR, {"message": etag}
+
+        result = await preconverted.get(s3_key, old_format, format_to, etag)
+        if result is not None:
+            logger.info(f"Returning the pre-converted {format_to} file for {s3_key}")
+            return Status.SUCCESS, result
+
+    key = f"convert:{s3_key}:{etag}:{old_format}:{format_to}"
+    return await single_flight.do(key, _convert_file, s3_key, old_format, format_to, profile, etag)
+
+
+def get_converted_s3_key(s3_key: str, old_format: str, format_to: str) -> str:
+    return s3_key.replace(f".{old_format}", f".{format_to}")
+
+
+async def _convert_file(
+    s3_key: str, old_format: str, format_to: str, profile: bool, etag: Optional[str]
+) -> ConverterHandler:
+    converter = get_file_converter_service()
+    bucket = settings.AWS_S3_BUCKET_NAME
+    region = settings.AWS_S3_REGION
+
+    with job_context("convert", s3_key=s3_key, format_from=old_format, format_to=format_to):
+        try:
+            logger.info("File conversion started")
+            converted_s3_key = get_converted_s3_key(s3_key, old_format, format_to)
+
+            with track_buffers(f"convert:{s3_key}"):
+                download_result, is_downloaded = await download_file_to_buffer(bucket, s3_key, etag)
+                if not is_downloaded:
+                    logger.error(f"File download failed. Details: {download_result}")
+                    return Status.ERROR, {"message": download_result}
+
+                with download_result, profile_job("convert", s3_key, requested=profile):
+                    conv_result, is_processed = await converter.file_processing(old_format, format_to, download_result)
+
+                if not is_processed:
+                    logger.error(f"File conversion failed.")
+                    return Status.ERROR, {"message": conv_result}
+
+                with conv_result:
+                    message, is_uploaded = await upload_buffer_to_s3(
+                        bucket, converted_s3_key, conv_result, format_to, {CONVERTED_FROM_METADATA: old_format}
+                    )
+
+            if not is_uploaded:
+                logger.error(f"File upload failed. Details: {message}")
+                return Status.ERROR, {"message": message}
+
+            file_url = f"https://{bucket}.s3.{region}.amazonaws.com/{converted_s3_key}"
+            logger.info("File conversion successful")
+            return Status.SUCCESS, {"file_url": file_url, "new_s3_key": converted_s3_key}
+        except Exception as e:
+            logger.error(f"An internal error occurred: {str(e)}")
+            return Status.ERROR, {"message": "Internal error"}
+
+
+async def images_to_pdf(
+    output_s3_key: str,
+    s3_keys: Optional[List[str]] = None,
+    prefix: Optional[str] = None,
+    max_dimension: Optional[int] = None,
+    jpeg_quality: Optional[int] = None,
+    profile: bool = False,
+) -> ConverterHandler:
+    """
+    Function to assemble several images from S3 bucket into a single PDF file, one page per image.
+    The images are given by the list of keys (pages in the list order) or by the prefix
+    (pages in the natural order of the keys, e.g. "page2" before "page10").
+    Concurrent calls with the same arguments share a single assembly, a profiled call always runs its own.
+    **Returns tuple with the str and the dict if the process was successful,
+    otherwise returns tuple with the str and the str.**
+
+    :param output_s3_key: name of the PDF file to upload to the S3 bucket - **str**.
+    :param s3_keys: names of the images in the S3 bucket - **list[str]**.
+    :param prefix: prefix of the images in the S3 bucket, used instead of the keys - **str**.
+    :param max_dimension: optional limit of the longer side of the images in pixels - **int**.
+    :param jpeg_quality: optional quality (1 - 100) to recompress the images as JPEG - **int**.
+    :param profile: capture a CPU profile and an allocation snapshot of the assembly - **bool**.
     :return: tuple with the status and the data. **status - str, data - str or dict**.
     """
 
+    if profile:
+        return await _images_to_pdf(output_s3_key, s3_keys, prefix, max_dimension, jpeg_quality, profile)
+
+    key = f"images-to-pdf:{output_s3_key}:{json.dumps([s3_keys, prefix, max_dimension, jpeg_quality])}"
+    return await single_flight.do(
+        key, _images_to_pdf, output_s3_key, s3_keys, prefix, max_dimension, jpeg_quality, profile
+    )
+
+
+async def _images_to_pdf(
+    output_s3_key: str,
+    s3_keys: Optional[List[str]],
+    prefix: Optional[str],
+    max_dimension: Optional[int],
+    jpeg_quality: Optional[int],
+    profile: bool,
+) -> ConverterHandler:
     converter = get_file_converter_service()
     bucket = settings.AWS_S3_BUCKET_NAME
     region = settings.AWS_S3_REGION
 
-    try:
-        logger.info("File conversion started")
-        converted_s3_key = s3_key.replace(f".{old_format}", f".{format_to}")
+    with job_context("images_to_pdf", s3_key=output_s3_key):
+        try:
+            if s3_keys is None:
+                listed_keys, is_listed = await list_object_keys(bucket, prefix)
+                if not is_listed:
+                    return Status.ERROR, {"message": listed_keys}
+
+                s3_keys = sorted(
+                    (key for key in listed_keys if _image_format(key) in ALLOWED_IMAGES_TYPES), key=natural_sort_key
+                )
 
-        download_result, is_downloaded = await download_file_as_bytes(bucket, s3_key)
-        if not is_downloaded:
-            logger.error(f"File download failed. Details: {download_result}")
-            return Status.ERROR, {"message": download_result}
+            if not s3_keys:
+                return Status.ERROR, {"message": "No images found"}
+            if len(s3_keys) > settings.IMAGES_PDF_MAX_IMAGES:
+                return Status.ERROR, {"message": f"Too many images, the limit is {settings.IMAGES_PDF_MAX_IMAGES}"}
+            if any(_image_format(key) not in ALLOWED_IMAGES_TYPES for key in s3_keys):
+                return Status.ERROR, {"message": "Unsupported file format"}
 
-        conv_result, is_processed = await converter.file_processing(old_format, format_to, download_result)
-        if not is_processed:
-            logger.error(f"File conversion failed.")
-            return Status.ERROR, {"message": conv_result}
+            logger.info(f"Assembling {len(s3_keys)} images into PDF")
+            images = [
+                (_image_format(s3_key), functools.partial(download_file_to_buffer, bucket, s3_key))
+                for s3_key in s3_keys
+            ]
 
-        message, is_uploaded = await upload_bytes_to_s3(bucket, converted_s3_key, conv_result, CONTENT_TYPES[format_to])
-        if not is_uploaded:
-            logger.error(f"File upload failed. Details: {message}")
-            return Status.ERROR, {"message": message}
+            with track_buffers(f"images_to_pdf:{output_s3_key}"):
+                with profile_job("images_to_pdf", output_s3_key, requested=profile):
+                    conv_result, is_processed = await converter.images_to_pdf(images, max_dimension, jpeg_quality)
 
-        file_url = f"https://{bucket}.s3.{region}.amazonaws.com/{converted_s3_key}"
-        logger.info("File conversion successful")
-        return Status.SUCCESS, {"file_url": file_url, "new_s3_key": converted_s3_key}
-    except Exception as e:
-        logger.error(f"An internal error occurred: {str(e)}")
-        return Status.ERROR, {"message": "Internal error"}
+                if not is_processed:
+                    logger.error(f"Images assembly failed.")
+                    return Status.ERROR, {"message": conv_result}
+
+                with conv_result:
+                    message, is_uploaded = await upload_buffer_to_s3(
+                        bucket, output_s3_key, conv_result, "pdf", {CONVERTED_FROM_METADATA: "images"}
+                    )
+
+            if not is_uploaded:
+                logger.error(f"File upload failed. Details: {message}")
+                return Status.ERROR, {"message": message}
 
+            file_url = f"https://{bucket}.s3.{region}.amazonaws.com/{output_s3_key}"
+            logger.info("Images assembly successful")
+            return Status.SUCCESS, {"file_url": file_url, "new_s3_key": output_s3_key, "pages": len(s3_keys)}
+        except Exception as e:
+            logger.error(f"An internal error occurred: {str(e)}")
+            return Status.ERROR, {"message": "Internal error"}
 
-async def file_scraper(s3_key: str, keywords: List[str]) -> ScraperHandler:
+
+def _image_format(s3_key: str) -> str:
+    return PurePosixPath(s3_key).suffix.lstrip(".").lower()
+
+
+async def file_scraper(
+    s3_key: str,
+    keywords: Optional[List[str]] = None,
+    max_results: Optional[int] = None,
+    queries: Optional[List[SearchQuery]] = None,
+    profile: bool = False,
+) -> ScraperHandler:
     """
     Function to scrape the file from the S3 bucket.
-    It searches the concrete sentence or a few sentences in the file be the list of keywords.
+    It searches the concrete sentence or a few sentences in the file be the list of keywords,
+    or by several named queries evaluated in one pass over the file.
+    Concurrent calls for the same file and keywords share a single search, a profiled call always runs its own.
     **Returns tuple with the str and the dict if the process was successful,
     otherwise returns tuple with the str and the str.**
 
     :param s3_key: name of the file in the S3 bucket - **str**.
     :param keywords: list of keywords to search in the file - **list[str]***.
+    :param max_results: optional limit of sentences to find per query - **int**.
+    :param queries: list of named queries used instead of the keywords - **list[SearchQuery]**.
+    :param profile: capture a CPU profile and an allocation snapshot of the search - **bool**.
     :return: tuple with the status and the data. ***status - str, data - str or dict**.
     """
 
+    is_multi_query = queries is not None
+    if not is_multi_query:
+        queries = [SearchQuery(name=DEFAULT_QUERY_NAME, keywords=keywords)]
+
+    if profile:
+        return await _file_scraper(s3_key, queries, max_results, is_multi_query, profile)
+
+    normalized_queries = sorted(
+        (query.name, sorted({kw.lower() for kw in query.keywords}), query.threshold) for query in queries
+    )
+    key = f"parse:{s3_key}:{json.dumps(normalized_queries)}:{max_results}:{is_multi_query}"
+    return await single_flight.do(key, _file_scraper, s3_key, queries, max_results, is_multi_query, profile)
+
+
+async def _file_scraper(
+    s3_key: str, queries: List[SearchQuery], max_results: Optional[int], is_multi_query: bool, profile: bool
+) -> ScraperHandler:
     scraper = get_file_scraper_service()
     bucket = settings.AWS_S3_BUCKET_NAME
 
-    try:
-        with tempfile.TemporaryDirectory() as tmpdir:
-            file_path = f"{tmpdir}/{s3_key}"
+    with job_context("parse", s3_key=s3_key):
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                file_path = f"{tmpdir}/{s3_key}"
 
-            message, is_downloaded = await download_file(bucket, s3_key, file_path)
-            if not is_downloaded:
-                return Status.ERROR, {"message": message}
+                message, is_downloaded = await download_file(bucket, s3_key, file_path)
+                if not is_downloaded:
+                    return Status.ERROR, {"message": message}
+
+                logger.info("File parsing has started")
+                with profile_job("parse", s3_key, requested=profile):
+                    details, is_processed = await scraper.file_processing(file_path, queries, max_results)
+
+                if not is_processed:
+                    logger.error(f"File parsing failed. Details: {details}")
+                    return Status.ERROR, {"message": details}
+
+            logger.info("File parsing successful")
+            if not is_multi_query:
+                sentences = details[DEFAULT_QUERY_NAME]
+                return Status.SUCCESS, {"count": len(sentences), "sentences": sentences}
 
-            logger.info("File parsing has started")
-            details, is_processed = await scraper.file_processing(file_path, keywords)
-            if not is_processed:
-                logger.error(f"File parsing failed. Details: {details}")
-                return Status.ERROR, {"message": details}
-
-        logger.info("File parsing successful")
-        return Status.SUCCESS, {"count": len(details), "sentences": details}
-    except Exception as e:
-        logger.error(f"An internal error occurred: {str(e)}")
-        return Status.ERROR, {"message": "Internal error"}
+            counts = {name: len(sentences) for name, sentences in details.items()}
+            matches = [
+                {"query": name, "sentence": sentence} for name, sentences in details.items() for sentence in sentences
+            ]
+            return Status.SUCCESS, {"count": len(matches), "counts": counts, "matches": matches}
+        except Exception as e:
+            logger.error(f"An internal error occurred: {str(e)}")
+            return Status.ERROR, {"message": "Internal error"}
@@ -0,0 +1,79 @@
+from typing import Optional, Tuple, Union
+
+import fitz
+
+DEFAULT_RESOLUTION = 72
+DEFAULT_JPEG_QUALITY = 90
+RECOMPRESSED_FORMATS = {"jpg": "jpeg", "jpeg": "jpeg", "png": "png"}
+
+
+class ImageTooLargeError(ValueError):
+    """The image has more pixels than allowed and is rejected before it is decoded."""
+
+
+def image_to_pdf_page(
+    source: Union[bytes, str],
+    image_format: str,
+    max_dimension: Optional[int],
+    jpeg_quality: Optional[int],
+    max_pixels: Optional[int] = None,
+) -> bytes:
+    """
+    Decode the image and place it on a single PDF page sized by the image resolution.
+    Runs in the worker processes, so it depends on nothing but PyMuPDF.
+
+    :param source: Image content or the path to the image file.
+    :param image_format: Image format, e.g. "png" or "jpg".
+    :param max_dimension: Downscale the image so that its longer side is at most this number of pixels.
+    :param jpeg_quality: Recompress the image as JPEG with this quality (1 - 100).
+    :param max_pixels: Reject the image if its width multiplied by its height exceeds this number.
+    :return: Single-page PDF document as bytes.
+    :raises ImageTooLargeError: If the image has more than `max_pixels` pixels.
+    """
+
+    if max_pixels is not None:
+        width, height = _image_size(source)
+        if width * height > max_pixels:
+            raise ImageTooLargeError(f"Image of {width}x{height} pixels exceeds the limit of {max_pixels} pixels")
+
+    pixmap = fitz.Pixmap(source)
+    xres, yres = pixmap.xres or DEFAULT_RESOLUTION, pixmap.yres or DEFAULT_RESOLUTION
+    rect = fitz.Rect(0, 0, pixmap.width * 72 / xres, pixmap.height * 72 / yres)
+
+    longest = max(pixmap.width, pixmap.height)
+    is_downscaled = max_dimension is not None and longest > max_dimension
+    if is_downscaled:
+        scale = max_dimension / longest
+        pixmap = fitz.Pixmap(pixmap, max(1, round(pixmap.width * scale)), max(1, round(pixmap.height * scale)), None)
+
+    with fitz.open() as doc:
+        page = doc.new_page(width=rect.width, height=rect.height)
+        if not is_downscaled and jpeg_quality is None:
+            page.insert_image(rect, **({"stream": source} if isinstance(source, bytes) else {"filename": source}))
+        else:
+            page.insert_image(rect, stream=_encode(pixmap, image_format, jpeg_quality))
+
+        return doc.tobytes(garbage=3, deflate=True)
+
+
+def _image_size(source: Union[bytes, str]) -> Tuple[int, int]:
+    """Read the size of the image from its header, without decoding the pixels."""
+
+    if isinstance(source, bytes):
+        image = fitz.mupdf.fz_new_image_from_buffer(fitz.mupdf.fz_new_buffer_from_copied_data(source))
+    else:
+        image = fitz.mupdf.fz_new_image_from_file(source)
+    return image.w(), image.h()
+
+
+def _encode(pixmap: fitz.Pixmap, image_format: str, jpeg_quality: Optional[int]) -> bytes:
+    output = "jpeg" if jpeg_quality is not None else RECOMPRESSED_FORMATS.get(image_format, "png")
+    if output == "png":
+        return pixmap.tobytes("png")
+
+    if pixmap.alpha:
+        pixmap = fitz.Pixmap(pixmap, 0)
+    if pixmap.colorspace is None or pixmap.colorspace.n not in (1, 3):
+        pixmap = fitz.Pixmap(fitz.csRGB, pixmap)
+
+    return pixmap.tobytes("jpeg", jpg_quality=jpeg_quality or DEFAULT_JPEG_QUALITY)
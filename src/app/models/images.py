@@ -0,0 +1,20 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field, PositiveInt, ValidationInfo, field_validator
+
+
+class ImagesToPdfRequest(BaseModel):
+    s3_keys: Optional[list[str]] = None
+    prefix: Optional[str] = Field(default=None, min_length=1, validate_default=True)
+    output_s3_key: str
+    callback_url: str
+    max_dimension: Optional[PositiveInt] = None
+    jpeg_quality: Optional[int] = Field(default=None, ge=1, le=100)
+    profile: bool = False
+
+    @field_validator("prefix")
+    @classmethod
+    def check_keys_or_prefix(cls, prefix: Optional[str], info: ValidationInfo):
+        if bool(info.data.get("s3_keys")) == (prefix is not None):
+            raise ValueError("Either s3_keys or prefix must be provided")
+        return prefix
@@ -0,0 +1,22 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field, PositiveInt, ValidationInfo, field_validator
+
+from src.app.models.queries import SearchQueries
+
+
+class FileParsingRequest(BaseModel):
+    s3_key: str
+    keywords: Optional[list[str]] = None
+    queries: Optional[SearchQueries] = Field(default=None, validate_default=True)
+    callback_url: str
+    max_results: Optional[PositiveInt] = None
+    profile: bool = False
+
+    @field_validator("queries")
+    @classmethod
+    def check_keywords_or_queries(cls, queries: Optional[SearchQueries], info: ValidationInfo):
+        has_keywords = bool(info.data.get("keywords"))
+        if has_keywords == bool(queries):
+            raise ValueError("Either keywords or queries must be provided")
+        return queries
@@ -0,0 +1,18 @@
+from typing import Annotated
+
+from pydantic import AfterValidator, BaseModel, Field
+
+
+class SearchQuery(BaseModel):
+    name: str
+    keywords: list[str] = Field(min_length=1)
+    threshold: int = Field(default=80, ge=0, le=100)
+
+
+def check_unique_names(queries: list[SearchQuery]) -> list[SearchQuery]:
+    if len({query.name for query in queries}) != len(queries):
+        raise ValueError("Query names must be unique")
+    return queries
+
+
+SearchQueries = Annotated[list[SearchQuery], AfterValidator(check_unique_names)]
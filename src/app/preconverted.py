@@ -0,0 +1,98 @@
+import copy
+import json
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from src.settings.config import settings, logger
+
+
+class PreconvertedRegistry:
+    """
+    Results of the speculative conversions made for S3 upload events.
+
+    Every result is stored with the ETag of the source version it was converted from and is returned only
+    for that version, so a result of an overwritten file is never served.
+    Results are kept in process memory for `PRECONVERT_RESULT_TTL` seconds.
+    When a Redis client is given, they are stored there as well, so a request served by another node can reuse them.
+    """
+
+    def __init__(self, redis_client: Optional[aioredis.Redis] = None):
+        self._redis = redis_client
+        self._local: Dict[str, Tuple[float, str, Dict]] = {}
+
+    @staticmethod
+    def _key(s3_key: str, format_from: str, format_to: str) -> str:
+        return f"preconverted:{s3_key}:{format_from}:{format_to}"
+
+    async def get(self, s3_key: str, format_from: str, format_to: str, etag: str) -> Optional[Dict]:
+        """
+        Return the result of the speculative conversion if there is one for the current version of the file.
+
+        :param s3_key: S3 key of the source file.
+        :param format_from: Source format.
+        :param format_to: Target format.
+        :param etag: ETag of the current version of the source file.
+        :return: Copy of the stored result data or None.
+        """
+
+        key = self._key(s3_key, format_from, format_to)
+        expires_at, stored_etag, data = self._local.get(key, (0.0, None, None))
+        if data is not None and stored_etag == etag and expires_at > time.monotonic():
+            return copy.deepcopy(data)
+
+        if self._redis is None:
+            return None
+
+        try:
+            cached = await self._redis.get(key)
+        except RedisError as e:
+            logger.warning(f"Failed to read pre-converted result: {str(e)}")
+            return None
+
+        if cached is None:
+            return None
+
+        cached = json.loads(cached)
+        return cached["data"] if cached["etag"] == etag else None
+
+    async def set(self, s3_key: str, format_from: str, format_to: str, etag: str, data: Dict) -> None:
+        key = self._key(s3_key, format_from, format_to)
+        self._prune()
+        self._local[key] = (time.monotonic() + settings.PRECONVERT_RESULT_TTL, etag, copy.deepcopy(data))
+
+        if self._redis is None:
+            return
+
+        try:
+            cached = json.dumps({"etag": etag, "data": data})
+            await self._redis.set(key, cached, ex=settings.PRECONVERT_RESULT_TTL)
+        except RedisError as e:
+            logger.warning(f"Failed to store pre-converted result: {str(e)}")
+
+    async def invalidate(self, s3_key: str, format_from: str, formats_to: Iterable[str]) -> None:
+        """Forget the results for the source file, e.g. because a new version of it was uploaded."""
+
+        keys = [self._key(s3_key, format_from, format_to) for format_to in formats_to]
+        for key in keys:
+            self._local.pop(key, None)
+
+        if self._redis is None or not keys:
+            return
+
+        try:
+            await self._redis.delete(*keys)
+        except RedisError as e:
+            logger.warning(f"Failed to invalidate pre-converted results: {str(e)}")
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _, _) in self._local.items() if expires_at <= now]:
+            del self._local[key]
+
+
+def get_preconverted_registry() -> PreconvertedRegistry:
+    redis_client = aioredis.from_url(settings.REDIS_URL) if settings.REDIS_URL else None
+    return PreconvertedRegistry(redis_client)
@@ -0,0 +1,224 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+from pydantic import BaseModel
+
+from src.settings.config import settings, logger
+
+T = TypeVar("T")
+
+NO_SAMPLES_NOTE = (
+    "No CPU samples: the job ran outside the sampled threads, e.g. in LibreOffice or in the image worker processes"
+)
+
+
+class ProfileRecord(BaseModel):
+    id: str
+    name: str
+    s3_key: str
+    started_at: float
+    duration: float
+    samples: int
+    cpu_profile: Optional[str]
+    allocations: Optional[str] = None
+    note: Optional[str] = None
+
+    def summary(self) -> Dict:
+        return {
+            **self.model_dump(exclude={"cpu_profile", "allocations"}),
+            "has_allocations": self.allocations is not None,
+        }
+
+
+class JobProfiler:
+    """
+    Sampling CPU profiler for a single job.
+
+    A background thread periodically records the stacks of the threads currently running the job's
+    blocking work (see `to_thread`). Stacks are aggregated in the folded format, one line per stack
+    with the number of samples, which can be rendered with flamegraph tools or speedscope.
+    Work done in other processes (LibreOffice, the image worker processes) is not sampled.
+    """
+
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._threads: Counter = Counter()
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="job-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._sampler.join()
+
+    def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Run the function in the current thread and sample its stacks."""
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._threads[ident] -= 1
+                if not self._threads[ident]:
+                    del self._threads[ident]
+
+    @property
+    def samples(self) -> int:
+        return sum(self._stacks.values())
+
+    def folded_stacks(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self._interval):
+            with self._lock:
+                idents = list(self._threads)
+
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self._stacks[self._fold(frame)] += 1
+
+    @staticmethod
+    def _fold(frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+            frame = frame.f_back
+
+        return ";".join(reversed(stack))
+
+
+class AllocationTracer:
+    """
+    Reference-counted tracemalloc, so that concurrent profiled jobs share a single trace.
+    Tracing covers the whole process: it slows down every running job and its snapshot includes
+    the allocations of all of them, not only of the profiled one.
+    """
+
+    def __init__(self):
+        self._users = 0
+        self._is_owner = False
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._is_owner = True
+            self._users += 1
+
+    def snapshot(self, limit: int) -> str:
+        if not tracemalloc.is_tracing():
+            return ""
+
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        statistics = snapshot.statistics("lineno")
+        lines = [f"Traced memory: current={current} B, peak={peak} B", f"Top {limit} allocations:"]
+        lines.extend(str(stat) for stat in statistics[:limit])
+        return "\n".join(lines)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._users -= 1
+            if self._users == 0 and self._is_owner:
+                tracemalloc.stop()
+                self._is_owner = False
+
+
+_active_profiler: ContextVar[Optional[JobProfiler]] = ContextVar("active_profiler", default=None)
+_allocation_tracer = AllocationTracer()
+_records: Deque[ProfileRecord] = deque(maxlen=settings.PROFILING_RING_SIZE)
+
+
+@contextmanager
+def profile_job(name: str, s3_key: str, requested: bool) -> Iterator[None]:
+    """
+    Profile the service call executed inside the block and store the result in the in-memory ring.
+    The job is profiled when it was asked to be or when it is picked by `PROFILING_SAMPLE_RATE`.
+    Allocations are traced only for explicitly requested profiles and only when `PROFILING_ALLOCATIONS` is on,
+    because tracing is process-wide (see `AllocationTracer`).
+
+    :param name: Name of the job, e.g. "convert" or "parse".
+    :param s3_key: S3 key of the processed file.
+    :param requested: Whether the profile was explicitly requested for the job.
+    """
+
+    if not requested and random.random() >= settings.PROFILING_SAMPLE_RATE:
+        yield
+        return
+
+    trace_allocations = requested and settings.PROFILING_ALLOCATIONS
+    profiler = JobProfiler(settings.PROFILING_INTERVAL)
+    token = _active_profiler.set(profiler)
+    if trace_allocations:
+        _allocation_tracer.start()
+    profiler.start()
+    started_at = time.time()
+    logger.info(f"Profiling of the {name} job for {s3_key} started")
+
+    try:
+        yield
+    finally:
+        duration = time.time() - started_at
+        profiler.stop()
+        allocations = None
+        if trace_allocations:
+            allocations = _allocation_tracer.snapshot(settings.PROFILING_TOP_ALLOCATIONS)
+            _allocation_tracer.stop()
+        _active_profiler.reset(token)
+
+        has_samples = profiler.samples > 0
+        record = ProfileRecord(
+            id=uuid.uuid4().hex,
+            name=name,
+            s3_key=s3_key,
+            started_at=started_at,
+            duration=duration,
+            samples=profiler.samples,
+            cpu_profile=profiler.folded_stacks() if has_samples else None,
+            allocations=allocations,
+            note=None if has_samples else NO_SAMPLES_NOTE,
+        )
+        _records.append(record)
+        logger.info(f"Profile {record.id} of the {name} job for {s3_key} stored")
+
+
+async def to_thread(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Same as `asyncio.to_thread`, but the function is sampled when the current job is being profiled.
+    """
+
+    profiler = _active_profiler.get()
+    if profiler is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    return await asyncio.to_thread(profiler.run, func, *args, **kwargs)
+
+
+def get_profiles() -> List[ProfileRecord]:
+    return list(_records)
+
+
+def get_profile(profile_id: str) -> Optional[ProfileRecord]:
+    return next((record for record in _records if record.id == profile_id), None)
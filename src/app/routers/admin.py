@@ -0,0 +1,57 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+
+from src.app.models.statuses import Status
+from src.app.profiling import get_profile, get_profiles
+from src.settings.config import settings
+
+
+async def verify_admin_key(x_admin_key: Optional[str] = Header(None)) -> None:
+    """The admin endpoints do not exist unless `ADMIN_KEY` is configured."""
+
+    if not settings.ADMIN_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_key is None or not secrets.compare_digest(x_admin_key, settings.ADMIN_KEY):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+
+router = APIRouter(dependencies=[Depends(verify_admin_key)])
+
+
+def profile_not_found() -> JSONResponse:
+    return JSONResponse(status_code=404, content={"status": Status.ERROR, "message": "Profile not found"})
+
+
+@router.get("/profiles")
+async def list_profiles() -> JSONResponse:
+    return JSONResponse(status_code=200, content={"profiles": [record.summary() for record in get_profiles()]})
+
+
+@router.get("/profiles/{profile_id}/cpu")
+async def download_cpu_profile(profile_id: str) -> Response:
+    record = get_profile(profile_id)
+    if record is None:
+        return profile_not_found()
+    if record.cpu_profile is None:
+        return JSONResponse(status_code=404, content={"status": Status.ERROR, "message": record.note})
+
+    headers = {"Content-Disposition": f'attachment; filename="{record.id}.folded"'}
+    return PlainTextResponse(record.cpu_profile, headers=headers)
+
+
+@router.get("/profiles/{profile_id}/allocations")
+async def download_allocations(profile_id: str) -> Response:
+    record = get_profile(profile_id)
+    if record is None:
+        return profile_not_found()
+    if record.allocations is None:
+        return JSONResponse(
+            status_code=404,
+            content={"status": Status.ERROR, "message": "Allocations were not captured for the profile"},
+        )
+
+    headers = {"Content-Disposition": f'attachment; filename="{record.id}.allocations.txt"'}
+    return PlainTextResponse(record.allocations, headers=headers)
@@ -2,7 +2,8 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 from starlette.responses import JSONResponse
 
-from src.app.handlers import convert_file
+from src.app.handlers import convert_file, images_to_pdf
+from src.app.models.images import ImagesToPdfRequest
 from src.app.models.statuses import Status
 from src.app.utils import callback
 
@@ -14,12 +15,32 @@ class ConvertFileRequest(BaseModel):
     format_from: str
     format_to: str
     callback_url: str
+    profile: bool = False
 
 
 @router.post("/convert-file")
 async def convert_from_docx_to_pdf(request: ConvertFileRequest) -> JSONResponse:
     try:
-        status, result = await convert_file(request.s3_key, request.format_from, request.format_to)
+        status, result = await convert_file(request.s3_key, request.format_from, request.format_to, request.profile)
+        response: dict = await callback(request.callback_url, status=status, data=result)
+        if response["status"] == Status.SUCCESS:
+            return JSONResponse(status_code=201, content={"status": Status.SUCCESS})
+        return JSONResponse(status_code=500, content=response)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"status": "error", "message": str(e)})
+
+
+@router.post("/images-to-pdf")
+async def convert_images_to_pdf(request: ImagesToPdfRequest) -> JSONResponse:
+    try:
+        status, result = await images_to_pdf(
+            request.output_s3_key,
+            request.s3_keys,
+            request.prefix,
+            request.max_dimension,
+            request.jpeg_quality,
+            request.profile,
+        )
         response: dict = await callback(request.callback_url, status=status, data=result)
         if response["status"] == Status.SUCCESS:
             return JSONResponse(status_code=201, content={"status": Status.SUCCESS})
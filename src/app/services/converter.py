@@ -1,37 +1,90 @@
 import asyncio
+import multiprocessing
 import tempfile
 import uuid
-from concurrent.futures import ThreadPoolExecutor
-from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Tuple
+from collections import deque
+from typing import Deque, List, Optional, Tuple, Union
 
 import fitz
 from pdf2docx import Converter
 
+from src.app.buffers import JobBuffer
 from src.app.constants import ALLOWED_IMAGES_TYPES, ALLOWED_FILE_FORMATS
+from src.app.imaging import ImageTooLargeError, image_to_pdf_page
+from src.app.profiling import to_thread
 from src.app.services.responses import ConverterErrorResponse
-from src.app.typing.converter import ConverterService
-from src.settings.config import logger
+from src.app.typing.converter import ConverterService, ImageLoader
+from src.settings.config import settings, logger
+
+_images_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_images_pool() -> ProcessPoolExecutor:
+    """
+    Worker processes decoding the images for `images_to_pdf`.
+    PyMuPDF holds the GIL, so separate processes are needed to decode the images in parallel.
+    """
+
+    global _images_pool
+    if _images_pool is None:
+        _images_pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGES_PDF_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _images_pool
+
+
+def reset_images_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Drop the broken pool, e.g. after a worker process was killed, so that the next call creates a new one.
+    Nothing is done if the pool was already replaced by another job.
+    """
+
+    global _images_pool
+    if _images_pool is pool:
+        _images_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_images_pool() -> None:
+    global _images_pool
+    if _images_pool is not None:
+        _images_pool.shutdown(cancel_futures=True)
+        _images_pool = None
 
 
 class FileConverterService:
     def __init__(self, tmp_dir="/tmp"):
         self.tmp_dir = Path(tmp_dir)
 
-    async def file_processing(self, format_from: str, format_to: str, file_bytes: BytesIO) -> ConverterService:
+    @staticmethod
+    def is_supported(format_from: str, format_to: str) -> bool:
+        """
+        Whether the pair of formats can be converted.
+        Images can only be turned into PDF or other images, LibreOffice cannot extract text or documents from them.
+        """
+
+        if format_from == format_to:
+            return False
+        if format_from in ALLOWED_IMAGES_TYPES:
+            return format_to == "pdf" or format_to in ALLOWED_IMAGES_TYPES
+        return format_from in ALLOWED_FILE_FORMATS and format_to in ALLOWED_FILE_FORMATS + ALLOWED_IMAGES_TYPES
+
+    async def file_processing(self, format_from: str, format_to: str, file_buffer: JobBuffer) -> ConverterService:
         """
         The main class method to call the conversion process.
 
         :param format_from: Input file format.
         :param format_to: Output file format.
-        :param file_bytes: Content of the file as BytesIO.
-        :return: Tuple with the converted file as BytesIO or str with the error message and boolean flag.
+        :param file_buffer: Content of the file as JobBuffer.
+        :return: Tuple with the converted file as JobBuffer or str with the error message and boolean flag.
         """
 
         try:
-            result, is_converted = await self._convert_file(format_from, format_to, file_bytes)
-            if is_converted and isinstance(result, BytesIO):
+            result, is_converted = await self._convert_file(format_from, format_to, file_buffer)
+            if is_converted and isinstance(result, JobBuffer):
                 logger.info("File successfully converted")
                 result.seek(0)
 
@@ -41,14 +94,96 @@ class FileConverterService:
             logger.error(f"Internal error: {str(e)}")
             return ConverterErrorResponse.INTERNAL_ERROR, False
 
-    async def _convert_file(self, format_from: str, format_to: str, file_bytes: BytesIO) -> ConverterService:
+    async def images_to_pdf(
+        self,
+        images: List[Tuple[str, ImageLoader]],
+        max_dimension: Optional[int] = None,
+        jpeg_quality: Optional[int] = None,
+    ) -> ConverterService:
+        """
+        Assemble the images into one PDF document, one page per image in the given order.
+        The images are loaded and decoded in parallel in the worker processes, each into a single-page PDF,
+        and the pages are appended to the document in order without recompressing them again.
+        At most `IMAGES_PDF_WINDOW` images are loaded or decoded at a time, so the memory used by the inputs
+        does not grow with their number.
+
+        :param images: List of tuples with the image format and the coroutine function loading the image.
+        :param max_dimension: Downscale the images so that their longer side is at most this number of pixels.
+        :param jpeg_quality: Recompress the images as JPEG with this quality (1 - 100).
+        :return: Tuple with the PDF file as JobBuffer or str with the error message and boolean flag.
+        """
+
+        pending: Deque[asyncio.Task] = deque()
+        doc = fitz.open()
+        try:
+            for image_format, load in images:
+                pending.append(asyncio.create_task(self._image_page(load, image_format, max_dimension, jpeg_quality)))
+                if len(pending) < settings.IMAGES_PDF_WINDOW:
+                    continue
+
+                page, is_decoded = await pending.popleft()
+                if not is_decoded:
+                    return page, False
+                await to_thread(self._append_pdf_page, doc, page)
+
+            while pending:
+                page, is_decoded = await pending.popleft()
+                if not is_decoded:
+                    return page, False
+                await to_thread(self._append_pdf_page, doc, page)
+
+            result = await to_thread(self._save_pdf, doc)
+            logger.info(f"{len(images)} images assembled into PDF")
+            return result, True
+
+        except Exception as e:
+            logger.error(f"Error during assembling images into PDF: {e}")
+            return ConverterErrorResponse.INTERNAL_ERROR, False
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            doc.close()
+
+    async def _image_page(
+        self, load: ImageLoader, image_format: str, max_dimension: Optional[int], jpeg_quality: Optional[int]
+    ) -> Tuple[Union[bytes, str], bool]:
+        image, is_loaded = await load()
+        if not is_loaded:
+            return image, False
+
+        with image:
+            loop = asyncio.get_running_loop()
+            source = self._image_source(image)
+            pool = get_images_pool()
+            try:
+                page = await loop.run_in_executor(
+                    pool,
+                    image_to_pdf_page,
+                    source,
+                    image_format,
+                    max_dimension,
+                    jpeg_quality,
+                    settings.IMAGES_PDF_MAX_PIXELS,
+                )
+            except ImageTooLargeError as e:
+                logger.error(f"Image rejected: {str(e)}")
+                return ConverterErrorResponse.IMAGE_TOO_LARGE, False
+            except BrokenProcessPool as e:
+                logger.error(f"Image worker process died, restarting the pool: {str(e)}")
+                reset_images_pool(pool)
+                return ConverterErrorResponse.INTERNAL_ERROR, False
+
+            return page, True
+
+    async def _convert_file(self, format_from: str, format_to: str, file_buffer: JobBuffer) -> ConverterService:
         """
         Convert a file from one format to another using LibreOffice or custom PDF converter.
 
         :param format_from: Input file format.
         :param format_to: Output file format.
-        :param file_bytes: The file content as BytesIO.
-        :return: Tuple with the converted file as BytesIO or str with the error message and boolean flag.
+        :param file_buffer: The file content as JobBuffer.
+        :return: Tuple with the converted file as JobBuffer or str with the error message and boolean flag.
         """
 
         try:
@@ -57,29 +192,28 @@ class FileConverterService:
             is_to_file_allowed_format = format_to in ALLOWED_FILE_FORMATS
 
             if (is_from_pdf_or_image and is_to_image) or (format_from != "pdf" and is_to_file_allowed_format):
-                return await self._convert_with_libreoffice(file_bytes, format_to)
+                return await self._convert_with_libreoffice(file_buffer, format_to)
 
-            return await self._pdf_converter(file_bytes, format_to)
+            return await self._pdf_converter(file_buffer, format_to)
 
         except Exception as e:
             logger.error(f"Conversion error: {e}")
             return ConverterErrorResponse.INTERNAL_ERROR, False
 
-    async def _convert_with_libreoffice(self, file_bytes: BytesIO, format_to: str) -> ConverterService:
+    async def _convert_with_libreoffice(self, file_buffer: JobBuffer, format_to: str) -> ConverterService:
         """
-        Convert a file using LibreOffice using RAM storage and parallel execution.
+        Convert a file using LibreOffice.
+        The input buffer is handed over by its path and the output file is wrapped without reading it into memory.
 
-        :param file_bytes: The file content as BytesIO.
+        :param file_buffer: The file content as JobBuffer.
         :param format_to: The target format (e.g., "pdf", "docx").
-        :return: Converted file as BytesIO or error message as string and boolean flag.
+        :return: Converted file as JobBuffer or error message as string and boolean flag.
         """
 
         try:
-            temp_dir = Path(tempfile.gettempdir())
-            input_path = temp_dir / f"{uuid.uuid4()}.input"
-            output_path = temp_dir / f"{uuid.uuid4()}.{format_to}"
+            input_path = file_buffer.path()
+            output_path = Path(tempfile.gettempdir()) / f"{uuid.uuid4()}.{format_to}"
 
-            input_path.write_bytes(file_bytes.getvalue())
             process = await asyncio.create_subprocess_exec(
                 "unoconv",
                 "-f",
@@ -94,57 +228,89 @@ class FileConverterService:
             stdout, stderr = await process.communicate()
 
             if process.returncode != 0:
-                Path(input_path).unlink(missing_ok=True)
-                Path(output_path).unlink(missing_ok=True)
+                output_path.unlink(missing_ok=True)
                 logger.error(f"LibreOffice conversion failed: {stderr.decode().strip()}")
                 return ConverterErrorResponse.INTERNAL_ERROR, False
 
-            converted_bytes = BytesIO(Path(output_path).read_bytes())
-            Path(input_path).unlink(missing_ok=True)
-            Path(output_path).unlink(missing_ok=True)
-
-            return converted_bytes, True
+            return JobBuffer.from_path(output_path), True
 
         except Exception as e:
             logger.error(f"Error during conversion: {e}")
             return ConverterErrorResponse.INTERNAL_ERROR, False
 
-    async def _pdf_converter(self, file_bytes: BytesIO, format_to: str) -> Tuple[BytesIO, bool]:
-        loop = asyncio.get_running_loop()
-        with ThreadPoolExecutor() as executor:
-            if format_to == "docx":
-                return await loop.run_in_executor(executor, self._convert_pdf_to_docx, file_bytes)
-            elif format_to == "txt":
-                return await loop.run_in_executor(executor, self._convert_pdf_to_txt, file_bytes)
-            elif format_to == "doc":
-                docx_file, _ = await loop.run_in_executor(executor, self._convert_pdf_to_docx, file_bytes)
+    async def _pdf_converter(self, file_buffer: JobBuffer, format_to: str) -> ConverterService:
+        if format_to == "docx":
+            return await to_thread(self._convert_pdf_to_docx, file_buffer)
+        elif format_to == "txt":
+            return await to_thread(self._convert_pdf_to_txt, file_buffer)
+        elif format_to == "doc":
+            docx_file, is_converted = await to_thread(self._convert_pdf_to_docx, file_buffer)
+            if not is_converted:
+                return docx_file, False
+
+            with docx_file:
                 return await self._convert_with_libreoffice(docx_file, "doc")
-            else:
-                return BytesIO(), False
+        else:
+            return ConverterErrorResponse.INTERNAL_ERROR, False
+
+    @staticmethod
+    def _pdf_source(file_buffer: JobBuffer) -> dict:
+        """Arguments to open the PDF: the file path for spilled buffers, the bytes otherwise."""
+        if file_buffer.in_memory:
+            return {"stream": file_buffer.getvalue()}
+        return {"filename": str(file_buffer.path())}
 
-    def _convert_pdf_to_docx(self, file_bytes: BytesIO) -> Tuple[BytesIO, bool]:
-        output_stream = BytesIO()
-        cv = Converter(stream=file_bytes.getvalue())
+    @staticmethod
+    def _image_source(file_buffer: JobBuffer) -> Union[bytes, str]:
+        """The image for a worker process: the file path for spilled buffers, the bytes otherwise."""
+        if file_buffer.in_memory:
+            return file_buffer.getvalue()
+        return str(file_buffer.path())
 
+    @staticmethod
+    def _append_pdf_page(doc: fitz.Document, page: bytes) -> None:
+        with fitz.open(stream=page, filetype="pdf") as page_doc:
+            doc.insert_pdf(page_doc)
+
+    @staticmethod
+    def _save_pdf(doc: fitz.Document) -> JobBuffer:
+        output_buffer = JobBuffer()
         try:
-            cv.convert(output_stream, start=0, end=None, parse_lattice_table=False)
+            doc.save(output_buffer, garbage=3, deflate=True)
+            output_buffer.seek(0)
+            return output_buffer
+        except Exception:
+            output_buffer.close()
+            raise
+
+    def _convert_pdf_to_docx(self, file_buffer: JobBuffer) -> ConverterService:
+        source = self._pdf_source(file_buffer)
+        cv = Converter(pdf_file=source.get("filename"), stream=source.get("stream"))
+        output_buffer = JobBuffer()
+
+        try:
+            cv.convert(output_buffer, start=0, end=None, parse_lattice_table=False)
             cv.close()
-            output_stream.seek(0)
-            return output_stream, True
+            output_buffer.seek(0)
+            return output_buffer, True
         except Exception as e:
             logger.error(f"Error during conversion: {str(e)}")
             cv.close()
-            return BytesIO(), False
+            output_buffer.close()
+            return ConverterErrorResponse.INTERNAL_ERROR, False
 
-    def _convert_pdf_to_txt(self, file_bytes) -> Tuple[BytesIO, bool]:
+    def _convert_pdf_to_txt(self, file_buffer: JobBuffer) -> ConverterService:
+        output_buffer = JobBuffer()
         try:
-            doc = fitz.open("pdf", file_bytes.read())
-            text = "\n".join([page.get_text() for page in doc])
+            with fitz.open(filetype="pdf", **self._pdf_source(file_buffer)) as doc:
+                for number, page in enumerate(doc):
+                    if number:
+                        output_buffer.write(b"\n")
+                    output_buffer.write(page.get_text().encode("utf-8"))
 
-            output = BytesIO()
-            output.write(text.encode("utf-8"))
-            output.seek(0)
-            return output, True
+            output_buffer.seek(0)
+            return output_buffer, True
         except Exception as e:
             logger.error(f"Error during convertion from pdf to txt: {e}")
-            return BytesIO(), False
+            output_buffer.close()
+            return ConverterErrorResponse.INTERNAL_ERROR, False
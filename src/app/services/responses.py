@@ -8,3 +8,4 @@ class ServiceErrorResponse(str, Enum):
 
 class ConverterErrorResponse(str, Enum):
     INTERNAL_ERROR = "An internal error while converting the file"
+    IMAGE_TOO_LARGE = "The image has too many pixels"
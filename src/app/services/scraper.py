@@ -1,153 +1,217 @@
 import asyncio
 import re
-from typing import List
+from typing import List, Optional, Tuple
 
 import aiofiles
 import fitz
 from docx import Document
 from rapidfuzz import fuzz
 
-from src.app.typing.scraper import ScraperService, EmptyListOrListStr
-from src.settings.config import logger
+from src.app.models.queries import SearchQuery
+from src.app.profiling import to_thread
+from src.app.typing.scraper import ScraperService, MatchesIterator, QueryMatches
+from src.settings.config import settings, logger
 from src.app.services.responses import ServiceErrorResponse
 
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
 
 class FileScraperService:
     def __init__(self):
-        self.keywords = []
+        self.queries: List[Tuple[str, List[str], int]] = []
 
-    async def file_processing(self, file_path: str, keywords: List[str]) -> ScraperService:
+    async def file_processing(
+        self, file_path: str, queries: List[SearchQuery], max_results: Optional[int] = None
+    ) -> ScraperService:
         """
         Process the file using the internal methods.
         First, download the file from the S3 bucket, after that extract text and then search for the keywords.
+        All queries are evaluated in a single pass over the extracted sentences.
+        Matches are collected incrementally, so the search stops as soon as every query has `max_results` sentences.
 
         :param file_path: Path to the file in the temporary directory.
-        :param keywords: List of keywords to search in the file.
-        :return: A tuple (`lust[str]`, `True`) if the process is successful.
+        :param queries: List of named queries, each one with its own keywords and threshold.
+        :param max_results: Optional limit of sentences to return per query.
+        :return: A tuple (`dict[str, list[str]]`, `True`) with the sentences per query name if the process is successful.
                  A tuple (`str`, `False`) with an error message if the process fails.
         """
 
         try:
-            self.keywords = keywords
+            self.queries = [(query.name, [kw.lower() for kw in query.keywords], query.threshold) for query in queries]
             if file_path.endswith(".txt"):
-                return await self.search_in_txt(file_path), True
+                matches = self.search_in_txt(file_path)
             elif file_path.endswith(".docx"):
-                return await self.search_in_docx(file_path), True
+                matches = self.search_in_docx(file_path)
             elif file_path.endswith(".pdf"):
-                return await self.search_in_pdf(file_path), True
+                matches = self.search_in_pdf(file_path)
+            else:
+                return ServiceErrorResponse.UNSUPPORTED_FILE_FORMAT, False
+
+            return await self._collect_matches(matches, max_results), True
         except Exception as e:
             logger.error(f"An internal error while scrapping: {str(e)}")
             return ServiceErrorResponse.INTERNAL_ERROR, False
-        return ServiceErrorResponse.UNSUPPORTED_FILE_FORMAT, False
 
-    async def search_in_txt(self, file_path: str) -> EmptyListOrListStr:
+    async def _collect_matches(self, matches: MatchesIterator, max_results: Optional[int]) -> QueryMatches:
+        """
+        Collect the sentences produced by one of the search methods.
+
+        :param matches: Async iterator yielding the matched sentences per query name.
+        :param max_results: Optional limit of sentences to collect per query.
+        :return: Dict with the list of sentences (possibly empty) for every query name.
         """
-        Read the text file and call the function to search for the keywords.
+
+        found_sentences = {name: [] for name, _, _ in self.queries}
+        async for batch in matches:
+            for name, sentences in batch.items():
+                found_sentences[name].extend(sentences)
+
+            if max_results is not None and all(len(found) >= max_results for found in found_sentences.values()):
+                logger.info(f"Results limit of {max_results} reached, stopping the search")
+                await matches.aclose()
+                break
+
+        if max_results is not None:
+            return {name: found[:max_results] for name, found in found_sentences.items()}
+
+        return found_sentences
+
+    async def search_in_txt(self, file_path: str) -> MatchesIterator:
+        """
+        Read the text file line by line and search for the keywords in batches of lines.
+        Every batch is cut at the last sentence end, the unfinished sentence is carried over to the next batch.
 
         :param file_path: Input file path.
-        :return: Empty list if no matches found, otherwise list of sentences with the keywords.
+        :return: Async iterator yielding the sentences with the keywords per query name.
         """
 
         async with aiofiles.open(file=file_path, mode="r", encoding="utf-8") as file:
             logger.info("Reading file")
-            result = await file.read()
+            lines, rest = [], ""
+            async for line in file:
+                lines.append(line)
+                if len(lines) < settings.SCRAPER_BATCH_SIZE:
+                    continue
+
+                text, rest = self._split_complete_sentences((rest + "".join(lines)).lstrip())
+                lines = []
+                if text:
+                    yield await to_thread(self.find_sentences_with_fuzzy_keywords, text)
+
             logger.info("File has been read")
-            return self.find_sentences_with_fuzzy_keywords(result)
 
-    async def search_in_docx(self, file_path: str) -> EmptyListOrListStr:
+        text = (rest + "".join(lines)).lstrip()
+        if text:
+            yield await to_thread(self.find_sentences_with_fuzzy_keywords, text)
+
+    @staticmethod
+    def _split_complete_sentences(text: str) -> Tuple[str, str]:
+        """Split the text into the complete sentences and the unfinished sentence after the last sentence end."""
+
+        last_end = None
+        for last_end in SENTENCE_END.finditer(text):
+            pass
+
+        if last_end is None:
+            return "", text
+
+        return text[: last_end.start()], text[last_end.end() :]
+
+    async def search_in_docx(self, file_path: str) -> MatchesIterator:
         """
-        Acts as an asynchronous shell for the synchronous _extract_docx function
+        Read the docx file and search for the keywords in batches of paragraphs.
 
         :param file_path: Input file path.
-        :return: Empty list if no matches found, otherwise list of sentences with the keywords.
+        :return: Async iterator yielding the sentences with the keywords per query name.
         """
 
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._extract_docx, file_path)
+        logger.info("Reading file")
+        paragraphs = await to_thread(self._extract_docx, file_path)
+        logger.info("File has been read")
+
+        for start in range(0, len(paragraphs), settings.SCRAPER_BATCH_SIZE):
+            batch = paragraphs[start : start + settings.SCRAPER_BATCH_SIZE]
+            yield await to_thread(self._search_in_batch, batch)
 
-    def _extract_docx(self, file_path: str) -> EmptyListOrListStr:
+    def _extract_docx(self, file_path: str) -> List[str]:
         """
-        Read the text file and call the function to search for the keywords.
+        Read the docx file and return its non-empty paragraphs.
 
         :param file_path: Input file path.
-        :return: Empty list if no matches found, otherwise list of sentences with the keywords.
+        :return: List of paragraphs text.
         """
 
         doc = Document(file_path)
-        paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
+        return [para.text for para in doc.paragraphs if para.text.strip()]
 
-        logger.info("Reading file")
-        found_sentences = []
-        for paragraph in paragraphs:
-            found_sentences.extend(self.find_sentences_with_fuzzy_keywords(paragraph))
+    def _search_in_batch(self, texts: List[str]) -> QueryMatches:
+        """Search for the keywords in every text of the batch."""
+        return self._merge_matches([self.find_sentences_with_fuzzy_keywords(text) for text in texts])
 
-        logger.info("File has been read")
-        return found_sentences
+    def _merge_matches(self, results: List[QueryMatches]) -> QueryMatches:
+        """Merge the sentences found in several texts, keeping the order of the texts."""
+        return {name: [sentence for result in results for sentence in result[name]] for name, _, _ in self.queries}
 
-    async def search_in_pdf(self, file_path: str) -> EmptyListOrListStr:
+    async def search_in_pdf(self, file_path: str) -> MatchesIterator:
         """
-        Read the text file and call the function to search for the keywords.
+        Read the pdf file and search for the keywords in batches of pages processed in parallel.
 
         :param file_path: Input file path.
-        :return: Empty list if no matches found, otherwise list of sentences with the keywords.
+        :return: Async iterator yielding the sentences with the keywords per query name.
         """
 
-        doc = fitz.open(file_path)
-
-        logger.info("Reading file")
-        tasks = [asyncio.to_thread(self._sync_extract_page, page) for page in doc]
-        pages_text = await asyncio.gather(*tasks)
-        logger.info("File has been read")
+        with fitz.open(file_path) as doc:
+            logger.info("Reading file")
+            for start in range(0, doc.page_count, settings.SCRAPER_BATCH_SIZE):
+                pages = range(start, min(start + settings.SCRAPER_BATCH_SIZE, doc.page_count))
+                tasks = [to_thread(self._sync_search_in_page, doc[number]) for number in pages]
+                results = await asyncio.gather(*tasks)
+                yield self._merge_matches(results)
 
-        tasks = [asyncio.to_thread(self.find_sentences_with_fuzzy_keywords, page_text) for page_text in pages_text]
-        results = await asyncio.gather(*tasks)
+            logger.info("File has been read")
 
-        return [sentence for result in results for sentence in result]
+    def _sync_search_in_page(self, page) -> QueryMatches:
+        """Extract text from the page and search for the keywords in it."""
+        return self.find_sentences_with_fuzzy_keywords(self._sync_extract_page(page))
 
     def _sync_extract_page(self, page) -> str:
         """Extract text from the page."""
         return page.get_text("text")
 
-    def find_sentences_with_fuzzy_keywords(self, text: str, threshold: int = 80) -> EmptyListOrListStr:
+    def find_sentences_with_fuzzy_keywords(self, text: str) -> QueryMatches:
         """
-        Search for sentences in the given text that contain fuzzy matches to predefined keywords.
+        Search for sentences in the given text that contain fuzzy matches to the keywords of every query.
 
-        This function splits the input text into sentences and checks each sentence for fuzzy matches
-        to the set of keywords stored in `self.keywords`. The match is determined based on the
-        similarity ratio between the words in each sentence and the keywords using fuzzy string matching.
-        Sentences that contain the highest number of fuzzy matches are returned.
+        This function splits the input text into sentences once and checks each sentence against all
+        queries stored in `self.queries`. A sentence matches a query when every keyword of the query has
+        a word in the sentence with the similarity ratio not lower than the query threshold.
 
         Parameters:
         - text (str):
             A string containing the text to search through. This text will be split into sentences
             to perform the fuzzy search for keywords.
 
-        - threshold (int, default=80):
-            An integer between 0 and 100 that defines the minimum similarity ratio (in percentage)
-            required for a word in a sentence to be considered a match to a keyword. The default value is 80.
-            A higher value means stricter matching criteria.
-
         Returns:
-        - List[str]:
-            A list of sentences that have the highest number of fuzzy keyword matches.
-            If no matches are found, returns an empty list. Each sentence in the result is a string.
+        - Dict[str, List[str]]:
+            The sentences matched by each query, keyed by the query name.
+            A query without matches gets an empty list.
         """
 
-        keywords = [kw.lower() for kw in self.keywords]
         clean_text = re.sub(r"\s*\n\s*", " ", text)
-        sentences = re.split(r"(?<=[.!?])\s+", clean_text)
+        sentences = SENTENCE_END.split(clean_text)
 
-        logger.info("Start searching for keywords")
+        logger.debug("Start searching for keywords", extra={"sampled": True})
 
-        matched_sentences = []
+        matched_sentences = {name: [] for name, _, _ in self.queries}
         for sentence in sentences:
-            words = sentence.lower().split()
-            if all(any(fuzz.ratio(word, keyword) >= threshold for word in words) for keyword in keywords):
-                matched_sentences.append(sentence)
+            words = set(sentence.lower().split())
+            for name, keywords, threshold in self.queries:
+                if all(any(fuzz.ratio(word, keyword) >= threshold for word in words) for keyword in keywords):
+                    matched_sentences[name].append(sentence)
 
-        if not matched_sentences:
-            logger.info("No matches found")
-            return []
+        if not any(matched_sentences.values()):
+            logger.debug("No matches found", extra={"sampled": True})
+            return matched_sentences
 
-        logger.info("File searching completed")
+        logger.debug("File searching completed", extra={"sampled": True})
         return matched_sentences
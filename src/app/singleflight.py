@@ -0,0 +1,130 @@
+import asyncio
+import copy
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from src.app.models.statuses import Status
+from src.settings.config import settings, logger
+
+HandlerResult = Tuple[str, Dict[str, Any]]
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into a single execution.
+
+    In-process callers with the same key attach to the task that is already running and all receive its result.
+    When a Redis client is given, the execution is additionally guarded by a distributed lock, and successful
+    results are kept for a short time so that callers waiting on other nodes can reuse them. A stored result is
+    reused only by callers which were already waiting for the lock when it was produced; later calls run again.
+    """
+
+    def __init__(self, redis_client: Optional[aioredis.Redis] = None):
+        self._redis = redis_client
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, func: Callable[..., Awaitable[HandlerResult]], *args, **kwargs) -> HandlerResult:
+        """
+        Run `func` once for all concurrent callers sharing the `key`.
+
+        :param key: Identity of the job, e.g. S3 key with the formats.
+        :param func: Handler coroutine function to execute.
+        :return: Result of the handler. Every caller gets its own copy, so it can be mutated safely.
+        """
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run(key, func, *args, **kwargs))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            logger.info(f"Joined in-flight job {key}")
+
+        status, data = await asyncio.shield(task)
+        return status, copy.deepcopy(data)
+
+    @property
+    def active_jobs(self) -> int:
+        """Number of distinct jobs running in this process."""
+        return len(self._in_flight)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    async def _run(self, key: str, func: Callable[..., Awaitable[HandlerResult]], *args, **kwargs) -> HandlerResult:
+        if self._redis is None:
+            return await func(*args, **kwargs)
+
+        result_key = f"singleflight:result:{key}"
+        try:
+            started_at = await self._now()
+            lock = self._redis.lock(
+                f"singleflight:lock:{key}",
+                timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT,
+                blocking_timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT,
+            )
+            is_locked = await lock.acquire()
+        except RedisError as e:
+            logger.warning(f"Single-flight lock is unavailable, running locally: {str(e)}")
+            return await func(*args, **kwargs)
+
+        try:
+            cached = await self._get_cached(result_key, started_at) if is_locked else None
+            if cached is not None:
+                logger.info(f"Reused result of job {key} from another node")
+                return cached
+
+            result = await func(*args, **kwargs)
+            if is_locked and result[0] == Status.SUCCESS:
+                await self._set_cached(result_key, result)
+
+            return result
+        finally:
+            if is_locked:
+                await self._release(lock)
+
+    async def _now(self) -> float:
+        """Current time of the Redis server, so that timestamps of different nodes are comparable."""
+
+        seconds, microseconds = await self._redis.time()
+        return seconds + microseconds / 1_000_000
+
+    async def _get_cached(self, result_key: str, started_at: float) -> Optional[HandlerResult]:
+        try:
+            cached = await self._redis.get(result_key)
+        except RedisError as e:
+            logger.warning(f"Failed to read single-flight result: {str(e)}")
+            return None
+
+        if cached is None:
+            return None
+
+        cached = json.loads(cached)
+        if cached["finished_at"] < started_at:
+            return None
+
+        return cached["status"], cached["data"]
+
+    async def _set_cached(self, result_key: str, result: HandlerResult) -> None:
+        status, data = result
+        try:
+            cached = {"status": status, "data": data, "finished_at": await self._now()}
+            await self._redis.set(result_key, json.dumps(cached), ex=settings.SINGLE_FLIGHT_RESULT_TTL)
+        except RedisError as e:
+            logger.warning(f"Failed to store single-flight result: {str(e)}")
+
+    @staticmethod
+    async def _release(lock) -> None:
+        try:
+            await lock.release()
+        except RedisError as e:
+            logger.warning(f"Failed to release single-flight lock: {str(e)}")
+
+
+def get_single_flight() -> SingleFlight:
+    redis_client = aioredis.from_url(settings.REDIS_URL) if settings.REDIS_URL else None
+    return SingleFlight(redis_client)
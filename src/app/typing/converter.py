@@ -1,5 +1,7 @@
-from io import BytesIO
-from typing import Tuple, Dict, Union
+from typing import Awaitable, Callable, Tuple, Dict, Union
 
-ConverterService = Tuple[Union[BytesIO, str], bool]
+from src.app.buffers import JobBuffer
+
+ConverterService = Tuple[Union[JobBuffer, str], bool]
 ConverterHandler = Tuple[str, Dict[str, str]]
+ImageLoader = Callable[[], Awaitable[ConverterService]]
@@ -1,5 +1,7 @@
-from typing import TypeAlias, Tuple, Union, List, Dict
+from typing import TypeAlias, Tuple, Union, List, Dict, AsyncIterator
 
-ScraperService: TypeAlias = Tuple[Union[str, List[str]], bool]
+ScraperService: TypeAlias = Tuple[Union[str, Dict[str, List[str]]], bool]
 ScraperHandler: TypeAlias = Tuple[str, Dict[str, Union[int, str]]]
 EmptyListOrListStr: TypeAlias = Union[List, List[str]]
+QueryMatches: TypeAlias = Dict[str, List[str]]
+MatchesIterator: TypeAlias = AsyncIterator[QueryMatches]
@@ -1,8 +1,16 @@
-from typing import Dict
+import json
+import re
+from typing import Dict, List, Tuple, Union
 
 import httpx
 
-from src.settings.config import logger
+from src.app.models.statuses import Status
+from src.settings.config import settings, logger
+
+
+def natural_sort_key(value: str) -> List[Union[int, str]]:
+    """Sort key which orders the numbers in the string by value, e.g. "page2" before "page10"."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", value)]
 
 
 async def callback(callback_url: str, status: str, data: Dict) -> Dict:
@@ -34,3 +42,59 @@ async def callback(callback_url: str, status: str, data: Dict) -> Dict:
             logger.error(e)
             await client.post(callback_url, json={"error": str(e)})
             return {"status": "error", "message": "Callback: Unexpected error"}
+
+
+def split_into_pages(items: List, max_bytes: int) -> List[List]:
+    """
+    Split the list of items into pages which JSON representation fits into `max_bytes`.
+    An item bigger than the limit gets a page of its own.
+
+    :param items: list of JSON serializable items.
+    :param max_bytes: maximum size of the page in bytes.
+    :return: **A list of pages**, at least one (possibly empty) page is always returned.
+    """
+
+    pages, page, page_size = [], [], 0
+    for item in items:
+        item_size = len(json.dumps(item).encode("utf-8")) + 1
+        if page and page_size + item_size > max_bytes:
+            pages.append(page)
+            page, page_size = [], 0
+
+        page.append(item)
+        page_size += item_size
+
+    pages.append(page)
+    return pages
+
+
+async def paginated_callback(
+    callback_url: str, status: str, data: Dict, items_keys: Tuple[str, ...] = ("sentences", "matches")
+) -> Dict:
+    """
+    Function to send the data to the external service in several bounded-size requests.
+    The first list found under one of `items_keys` is split into pages of at most `CALLBACK_MAX_BYTES`,
+    every request carries the page number (`page`, starting from 1) and the `total_pages`.
+    If the data has no such list, it is sent with a single regular callback.
+
+    :param callback_url: callback URL of an external service
+    :param status: status of the process - success, processing, waiting, error etc.
+    :param data: the dict with the data to send after the process.
+    :param items_keys: the keys of the lists which can be split into pages.
+    :return: **A dict with the status of the process.**
+             Statuses: success, processing, waiting, error etc.
+    """
+
+    items_key = next((key for key in items_keys if isinstance(data, dict) and isinstance(data.get(key), list)), None)
+    if items_key is None:
+        return await callback(callback_url, status=status, data=data)
+
+    pages = split_into_pages(data[items_key], settings.CALLBACK_MAX_BYTES)
+    for number, page in enumerate(pages, start=1):
+        page_data = {**data, items_key: page, "page": number, "total_pages": len(pages)}
+        response = await callback(callback_url, status=status, data=page_data)
+        if response["status"] == Status.ERROR:
+            logger.error(f"Callback failed on page {number} of {len(pages)}")
+            return response
+
+    return {"status": status}
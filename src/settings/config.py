@@ -1,12 +1,20 @@
 import logging
+import os
+import tempfile
 
-from colorama import Fore, Style
-from decouple import config
+from decouple import Csv, config
 from pydantic_settings import BaseSettings
 
+from src.settings.log import setup_logging
+
 
 class Settings(BaseSettings):
     SECRET_KEY: str = config("SECRET_KEY", "mock-secret-key")
+    ADMIN_KEY: str = config("ADMIN_KEY", "")
+
+    LOG_LEVEL: str = config("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = config("LOG_FORMAT", "json")
+    LOG_SAMPLE_RATE: float = config("LOG_SAMPLE_RATE", 0.01, cast=float)
 
     AWS_ACCESS_KEY_ID: str = config("AWS_ACCESS_KEY_ID", "mock-access-key")
     AWS_SECRET_ACCESS_KEY: str = config("AWS_SECRET_ACCESS_KEY", "mock-secret-key")
@@ -14,25 +22,47 @@ class Settings(BaseSettings):
     AWS_SQS_QUEUE_URL: str = config("AWS_SQS_QUEUE_URL", "mock-queue-url")
     AWS_S3_REGION: str = config("AWS_S3_REGION", "eu-north-1")
 
+    AWS_MAX_POOL_CONNECTIONS: int = config("AWS_MAX_POOL_CONNECTIONS", 100, cast=int)
+    AWS_CONNECT_TIMEOUT: float = config("AWS_CONNECT_TIMEOUT", 5, cast=float)
+    AWS_READ_TIMEOUT: float = config("AWS_READ_TIMEOUT", 60, cast=float)
+    AWS_KEEPALIVE_TIMEOUT: float = config("AWS_KEEPALIVE_TIMEOUT", 12, cast=float)
+    AWS_MAX_ATTEMPTS: int = config("AWS_MAX_ATTEMPTS", 5, cast=int)
+    AWS_RETRY_MODE: str = config("AWS_RETRY_MODE", "standard")
+    AWS_SQS_MAX_BACKOFF: float = config("AWS_SQS_MAX_BACKOFF", 60, cast=float)
+    AWS_S3_MULTIPART_THRESHOLD: int = config("AWS_S3_MULTIPART_THRESHOLD", 64 * 1024 * 1024, cast=int)
+    AWS_S3_MULTIPART_CHUNK_SIZE: int = config("AWS_S3_MULTIPART_CHUNK_SIZE", 16 * 1024 * 1024, cast=int)
 
-class ColorLogFormatter(logging.Formatter):
-    COLORS = {
-        logging.DEBUG: Fore.BLUE,
-        logging.INFO: Fore.GREEN,
-        logging.WARNING: Fore.LIGHTYELLOW_EX,
-        logging.ERROR: Fore.RED,
-        logging.CRITICAL: Fore.RED + Style.BRIGHT,
-    }
+    REDIS_URL: str = config("REDIS_URL", "")
+    SINGLE_FLIGHT_LOCK_TIMEOUT: float = config("SINGLE_FLIGHT_LOCK_TIMEOUT", 300, cast=float)
+    SINGLE_FLIGHT_RESULT_TTL: int = config("SINGLE_FLIGHT_RESULT_TTL", 60, cast=int)
 
-    def format(self, record: logging.LogRecord) -> str:
-        color = self.COLORS.get(record.levelno, "")
-        message = super().format(record)
-        return f"{color}{message}{Style.RESET_ALL}"
+    SCRAPER_BATCH_SIZE: int = config("SCRAPER_BATCH_SIZE", 16, cast=int)
+    CALLBACK_MAX_BYTES: int = config("CALLBACK_MAX_BYTES", 1_000_000, cast=int)
 
+    PROFILING_SAMPLE_RATE: float = config("PROFILING_SAMPLE_RATE", 0.0, cast=float)
+    PROFILING_INTERVAL: float = config("PROFILING_INTERVAL", 0.005, cast=float)
+    PROFILING_RING_SIZE: int = config("PROFILING_RING_SIZE", 20, cast=int)
+    PROFILING_TOP_ALLOCATIONS: int = config("PROFILING_TOP_ALLOCATIONS", 25, cast=int)
+    PROFILING_ALLOCATIONS: bool = config("PROFILING_ALLOCATIONS", False, cast=bool)
+
+    BUFFER_MAX_MEMORY_SIZE: int = config("BUFFER_MAX_MEMORY_SIZE", 8 * 1024 * 1024, cast=int)
+    BUFFER_TMP_DIR: str = config("BUFFER_TMP_DIR", tempfile.gettempdir())
+
+    PRECONVERT_ENABLED: bool = config("PRECONVERT_ENABLED", False, cast=bool)
+    PRECONVERT_FORMATS: list[str] = config("PRECONVERT_FORMATS", "pdf,txt", cast=Csv())
+    PRECONVERT_MAX_CONCURRENCY: int = config("PRECONVERT_MAX_CONCURRENCY", 1, cast=int)
+    PRECONVERT_MAX_ACTIVE_JOBS: int = config("PRECONVERT_MAX_ACTIVE_JOBS", 2, cast=int)
+    PRECONVERT_MAX_WAIT: float = config("PRECONVERT_MAX_WAIT", 300, cast=float)
+    PRECONVERT_CAPACITY_CHECK_INTERVAL: float = config("PRECONVERT_CAPACITY_CHECK_INTERVAL", 1, cast=float)
+    PRECONVERT_RESULT_TTL: int = config("PRECONVERT_RESULT_TTL", 86400, cast=int)
+
+    IMAGES_PDF_WORKERS: int = config("IMAGES_PDF_WORKERS", os.cpu_count() or 1, cast=int)
+    IMAGES_PDF_WINDOW: int = config("IMAGES_PDF_WINDOW", 2 * (os.cpu_count() or 1), cast=int)
+    IMAGES_PDF_MAX_IMAGES: int = config("IMAGES_PDF_MAX_IMAGES", 1000, cast=int)
+    IMAGES_PDF_MAX_PIXELS: int = config("IMAGES_PDF_MAX_PIXELS", 100_000_000, cast=int)
 
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(ColorLogFormatter("%(levelname)s: %(message)s"))
-logging.basicConfig(level=logging.DEBUG, handlers=[console_handler])
-logger = logging.getLogger(__name__)
 
 settings = Settings()
+
+log_listener = setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_SAMPLE_RATE)
+logger = logging.getLogger(__name__)
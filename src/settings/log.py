@@ -0,0 +1,147 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterator
+
+from colorama import Fore, Style
+
+_job_context: ContextVar[Dict[str, str]] = ContextVar("log_job_context", default={})
+
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class ColorLogFormatter(logging.Formatter):
+    COLORS = {
+        logging.DEBUG: Fore.BLUE,
+        logging.INFO: Fore.GREEN,
+        logging.WARNING: Fore.LIGHTYELLOW_EX,
+        logging.ERROR: Fore.RED,
+        logging.CRITICAL: Fore.RED + Style.BRIGHT,
+    }
+
+    def format(self, record: logging.LogRecord) -> str:
+        color = self.COLORS.get(record.levelno, "")
+        message = super().format(record)
+        return f"{color}{message}{Style.RESET_ALL}"
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Formats the record as a single JSON line, including the job context and the `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_text:
+            data["exception"] = record.exc_text
+
+        return json.dumps(data, default=str)
+
+
+class TracebackQueueHandler(QueueHandler):
+    """
+    Same as `QueueHandler`, but the traceback is kept in `exc_text` instead of being merged into the message,
+    so that the formatters of the listener can output it separately.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JobContextFilter(logging.Filter):
+    """Adds the fields of the current job (see `job_context`) to the record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _job_context.get().items():
+            setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes only a share of the records logged with `extra={"sampled": True}`, e.g. per-page messages.
+    Other records always pass.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.rate
+
+
+def setup_logging(level: str, log_format: str, sample_rate: float) -> QueueListener:
+    """
+    Configure the root logger to hand the records to a background thread through a queue,
+    so that the threads doing the work never block on writing the logs.
+
+    :param level: Name of the root log level, e.g. "INFO".
+    :param log_format: "json" for structured logs, "color" for human-readable colored logs.
+    :param sample_rate: Share of the sampled records to keep, from 0.0 to 1.0.
+    :return: The started listener writing the records.
+    """
+
+    stream_handler = logging.StreamHandler()
+    if log_format == "json":
+        stream_handler.setFormatter(JsonLogFormatter())
+    else:
+        stream_handler.setFormatter(ColorLogFormatter("%(levelname)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = TracebackQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    queue_handler.addFilter(JobContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level.upper())
+
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+@contextmanager
+def job_context(job: str, **fields: str) -> Iterator[Dict[str, str]]:
+    """
+    Attach a generated `job_id`, the job name and the given fields to every record logged inside the block,
+    including worker threads started from it. The duration of the job is logged when the block exits.
+
+    :param job: Name of the job, e.g. "convert" or "parse".
+    :return: The fields attached to the records.
+    """
+
+    context = {"job_id": uuid.uuid4().hex, "job": job, **fields}
+    token = _job_context.set(context)
+    started_at = time.perf_counter()
+    try:
+        yield context
+    finally:
+        duration_ms = round((time.perf_counter() - started_at) * 1000, 3)
+        logging.getLogger(__name__).info("Job finished", extra={"duration_ms": duration_ms})
+        _job_context.reset(token)